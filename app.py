@@ -1,76 +1,1879 @@
 import os
 import re
 import random
+import math
 import sqlite3
 import uuid
-from flask import Flask, render_template_string, jsonify, request, make_response
-import PyPDF2
+import secrets
+import json
+import operator
+import functools
+import bisect
+import time
+import queue
+import atexit
+import hashlib
+import threading
+import csv
+import io
+import gzip
+import mimetypes
+import subprocess
+import sys
+import contextlib
+import mmap
+import multiprocessing
+import struct
+import zlib
+import zipfile
+import datetime
+import click
+from array import array
+from collections import namedtuple, OrderedDict, Counter
+from concurrent.futures import ProcessPoolExecutor
+from flask import Flask, jsonify, request, make_response, redirect, g
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.security import safe_join
+from xml.sax.saxutils import escape as xml_escape
 
-app = Flask(__name__)
+from pdf_pages import extract_page_range
+
+try:
+    import brotli  # ixtiyari: quraşdırılıbsa .br variantları da verilir
+except ImportError:
+    brotli = None
+try:
+    import orjson  # ixtiyari: sürətli JSON kodlayıcı
+except ImportError:
+    orjson = None
+
+# Statik fayllar aşağıdakı öz route-umuzla (sıxılmış variantlarla) verilir
+app = Flask(__name__, static_folder=None)
 
 # --- KONFİQURASİYA ---
 PDF_FILENAME = 'mmsillabussu.pdf'
-DB_FILENAME = 'quiz.db'
+DB_FILENAME = os.environ.get('QUIZ_DB', 'quiz.db')
+# `flask compile-bank` ilə yaradılır. Fayl varsa PDF (və PyPDF2) ümumiyyətlə açılmır.
+BANK_FILENAME = 'mmsillabussu.qbank'
+# Əlavə fənlər: BANKS_DIR/<ad>.pdf (və ya <ad>.qbank) -> /api/questions?bank=<ad>
+BANKS_DIR = 'banks'
+# Bundan çox səhifəsi olan PDF-lər proses hovuzunda hissə-hissə oxunur
+PARALLEL_PAGE_THRESHOLD = 200
+PAGES_PER_TASK = 50
+EXAM_SIZE = 50
+# Bölmələrə görə balanslı seçim: None, bölmə sayı (məs. 5) və ya ID aralıqları ("1-200,201-400")
+EXAM_STRATA = None
+# Admin endpoint-ləri üçün X-Admin-Token başlığı; təyin olunmayıbsa onlar bağlıdır
+ADMIN_TOKEN = os.environ.get('QUIZ_ADMIN_TOKEN')
+LEADERBOARD_SIZE = 10
+# Digər worker-lərin yazılarını görmək üçün bazanın yoxlanılma intervalı (saniyə)
+LEADERBOARD_REFRESH = 5.0
+# Yazı növbəsi: ən çox bu qədər gözləyən yazı, flush intervalı (saniyə) və bir tranzaksiyadakı limit
+WRITE_QUEUE_SIZE = 10000
+WRITE_FLUSH_INTERVAL = 0.2
+WRITE_BATCH_SIZE = 2000
+# "database is locked" kimi xətada toplu yazı təkrarlanır; gözləmə hər dəfə ikiqat artır (ən çox bu qədər saniyə)
+WRITE_RETRY_MAX = 5.0
+# Bundan köhnə xam cəhdlər silinir - günlük aqreqatlarda artıq saxlanılıb
+ATTEMPT_RETENTION_DAYS = 90
+ATTEMPT_COMPACT_CHUNK = 5000
+# İxrac kursoru bu qədər sətir oxuyub bir hissə (chunk) kimi göndərir
+EXPORT_CHUNK_ROWS = 1000
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+# `flask build-css` bu binary ilə static/src/app.css-dən static/app.css yaradır
+TAILWIND_BIN = os.environ.get('TAILWIND_BIN', 'tailwindcss')
+# gunicorn altında hər worker metriklərini bu qovluğa yazır, /metrics hamısını toplayır.
+# Server başlamazdan əvvəl qovluq təmizlənməlidir. Təyin olunmayıbsa yalnız cari prosesin metrikləri.
+METRICS_DIR = os.environ.get('QUIZ_METRICS_DIR')
+METRICS_DUMP_INTERVAL = 1.0
+# Məs. QUIZ_PROFILE_ROUTE=/api/questions - yalnız bu route üçün nümunə götürən profiler işləyir
+PROFILE_ROUTE = os.environ.get('QUIZ_PROFILE_ROUTE')
+PROFILE_INTERVAL = 0.005
+
+# --- METRİKLƏR ---
+# Gecikmə histogramları və sayğaclar prosesin yaddaşında toplanır. METRICS_DIR varsa hər worker
+# ən çox METRICS_DUMP_INTERVAL saniyədən bir öz snapshot-ını metrics-<pid>.json faylına yazır;
+# /metrics bütün faylları toplayıb Prometheus mətn formatında qaytarır (histogramlar toplana bilir).
+METRIC_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRIC_HELP = {
+    'examsim_http_request_duration_seconds': 'HTTP sorğularının route üzrə gecikməsi',
+    'examsim_stage_duration_seconds': 'Daxili mərhələlərin gecikməsi (PDF, parse, seçim, JSON)',
+    'examsim_sql_duration_seconds': 'Hər SQL ifadəsinin icra vaxtı (kilid gözləməsi daxil)',
+    'examsim_events_total': 'Hadisə sayğacları',
+}
+
+class Metrics:
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._hist = {}
+        self._counters = {}
+        self._dumped_at = 0.0
+        self._dump_lock = threading.Lock()
+
+    def _check_fork(self):
+        # fork-dan əvvəl (məs. --preload) toplanan dəyərlər hər worker-də təkrar sayılmasın
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._hist, self._counters = {}, {}
+
+    def observe(self, name, labels, seconds):
+        i = bisect.bisect_left(METRIC_BUCKETS, seconds)
+        with self._lock:
+            self._check_fork()
+            h = self._hist.get((name, labels))
+            if h is None:
+                h = self._hist[(name, labels)] = [0] * (len(METRIC_BUCKETS) + 1) + [0.0]
+            h[i] += 1
+            h[-1] += seconds
+        self._maybe_dump()
+
+    def inc(self, name, labels, value=1):
+        with self._lock:
+            self._check_fork()
+            self._counters[(name, labels)] = self._counters.get((name, labels), 0) + value
+        self._maybe_dump()
+
+    @contextlib.contextmanager
+    def timer(self, name, labels):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, labels, time.perf_counter() - t)
+
+    def _snapshot(self):
+        with self._lock:
+            return {'h': [[n, list(l), v] for (n, l), v in self._hist.items()],
+                    'c': [[n, list(l), v] for (n, l), v in self._counters.items()]}
+
+    def _maybe_dump(self, force=False):
+        if not self.directory or (not force and time.monotonic() - self._dumped_at < METRICS_DUMP_INTERVAL):
+            return
+        # Sorğu thread-ləri başqasının yazmasını gözləmir; /metrics (force) isə gözləyir ki, snapshot təzə olsun
+        if not self._dump_lock.acquire(blocking=force):
+            return
+        try:
+            if not force and time.monotonic() - self._dumped_at < METRICS_DUMP_INTERVAL:
+                return
+            self._dumped_at = time.monotonic()
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f'metrics-{os.getpid()}.json')
+            tmp = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(self._snapshot(), f)
+            os.replace(tmp, path)
+        except Exception as e:
+            # Metrik yazıla bilmədisə sorğu (observe/inc çağıran) xəta ilə bitməməlidir
+            app.logger.warning("Metriklər yazılmadı: %s", e)
+        finally:
+            self._dump_lock.release()
+
+    def collect(self):
+        if self.directory:
+            self._maybe_dump(force=True)
+            snapshots = []
+            for entry in os.listdir(self.directory):
+                if entry.startswith('metrics-') and entry.endswith('.json'):
+                    try:
+                        with open(os.path.join(self.directory, entry)) as f:
+                            snapshots.append(json.load(f))
+                    except (OSError, ValueError):
+                        continue
+        else:
+            snapshots = [self._snapshot()]
+        hist, counters = {}, {}
+        for snap in snapshots:
+            for name, labels, values in snap['h']:
+                key = (name, tuple(map(tuple, labels)))
+                total = hist.setdefault(key, [0] * len(values))
+                for i, v in enumerate(values):
+                    total[i] += v
+            for name, labels, value in snap['c']:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+        return hist, counters
+
+    def render(self):
+        hist, counters = self.collect()
+        fmt = lambda labels: ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                                      for k, v in labels)
+        out = []
+        for name in sorted({n for n, _ in hist}):
+            out.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+            out.append(f"# TYPE {name} histogram")
+            for (n, labels), values in sorted(hist.items()):
+                if n != name: continue
+                cumulative = 0
+                for le, count in zip(METRIC_BUCKETS + ('+Inf',), values):
+                    cumulative += count
+                    out.append(f'{name}_bucket{{{fmt(labels + (("le", le),))}}} {cumulative}')
+                out.append(f'{name}_sum{{{fmt(labels)}}} {values[-1]:.6f}')
+                out.append(f'{name}_count{{{fmt(labels)}}} {cumulative}')
+        for name in sorted({n for n, _ in counters}):
+            out.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+            out.append(f"# TYPE {name} counter")
+            for (n, labels), value in sorted(counters.items()):
+                if n == name:
+                    out.append(f'{name}{{{fmt(labels)}}} {value}')
+        return '\n'.join(out) + '\n'
+
+metrics = Metrics(METRICS_DIR)
+
+def timed_stage(stage):
+    labels = (('stage', stage),)
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                metrics.observe('examsim_stage_duration_seconds', labels, time.perf_counter() - t)
+        return wrapper
+    return decorate
+
+@functools.lru_cache(maxsize=512)
+def _sql_labels(sql):
+    return (('statement', ' '.join(sql.split())[:120]),)
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        with metrics.timer('examsim_sql_duration_seconds', _sql_labels(sql)):
+            return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        with metrics.timer('examsim_sql_duration_seconds', _sql_labels(sql)):
+            return super().executemany(sql, seq_of_parameters)
+
+class TimedConnection(sqlite3.Connection):
+    # Connection.execute C səviyyəsində cursor-u birbaşa çağırır, ona görə ayrıca sarınır
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        with metrics.timer('examsim_sql_duration_seconds', _sql_labels('COMMIT')):
+            return super().commit()
+
+class TimedJSONProvider(DefaultJSONProvider):
+    @timed_stage('json_encode')
+    def dumps(self, obj, **kwargs):
+        return super().dumps(obj, **kwargs)
+
+app.json = TimedJSONProvider(app)
+
+# Nümunə götürən profiler: PROFILE_ROUTE-a düşən sorğuların thread-lərinin stekini hər
+# PROFILE_INTERVAL saniyədən bir oxuyur və "collapsed stack" formatında (flamegraph.pl) sayır.
+class SamplingProfiler:
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self._threads = set()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _ensure_started(self):
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name='sampling-profiler', daemon=True).start()
+
+    def enter(self):
+        with self._lock:
+            self._ensure_started()
+            self._threads.add(threading.get_ident())
+
+    def leave(self):
+        with self._lock:
+            self._threads.discard(threading.get_ident())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                threads = list(self._threads)
+            if not threads: continue
+            frames = sys._current_frames()
+            for ident in threads:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if stack:
+                    with self._lock:
+                        self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self, reset=False):
+        with self._lock:
+            lines = [f"{stack} {n}" for stack, n in self.stacks.most_common()]
+            if reset: self.stacks.clear()
+        return '\n'.join(lines) + '\n'
+
+profiler = SamplingProfiler()
+
+@app.before_request
+def _metrics_before_request():
+    g.started_at = time.perf_counter()
+    if PROFILE_ROUTE and request.url_rule is not None and request.url_rule.rule == PROFILE_ROUTE:
+        profiler.enter()
+        g.profiled = True
+
+@app.after_request
+def _metrics_after_request(response):
+    started = g.pop('started_at', None)
+    if started is not None:
+        rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        labels = (('route', rule), ('method', request.method), ('status', str(response.status_code)))
+        metrics.observe('examsim_http_request_duration_seconds', labels, time.perf_counter() - started)
+    return response
+
+@app.teardown_request
+def _metrics_teardown(exc):
+    if g.pop('profiled', False):
+        profiler.leave()
 
 # --- VERİLƏNLƏR BAZASI ---
+# Hər thread (və fork-dan sonra hər proses) öz bağlantısını bir dəfə açır və saxlayır.
+# WAL rejimində oxucular yazanı bloklamır; busy_timeout "database is locked" əvəzinə gözləyir.
+SQLITE_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=67108864",
+    "PRAGMA temp_store=MEMORY",
+)
+_db_local = threading.local()
+
+def connect_db(check_same_thread=True):
+    # cached_statements: hazırlanmış sorğular bağlantı səviyyəsində təkrar istifadə olunur
+    conn = sqlite3.connect(DB_FILENAME, timeout=5.0, cached_statements=256, check_same_thread=check_same_thread,
+                           factory=TimedConnection)
+    for pragma in SQLITE_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def get_db():
+    conn = getattr(_db_local, 'conn', None)
+    if conn is None or _db_local.pid != os.getpid():
+        conn = _db_local.conn = connect_db()
+        _db_local.pid = os.getpid()
+    return conn
+
 def init_db():
-    conn = sqlite3.connect(DB_FILENAME)
+    conn = connect_db()
+    # WAL rejimi bazada saxlanılır - bir dəfə təyin etmək kifayətdir
+    conn.execute("PRAGMA journal_mode=WAL")
     c = conn.cursor()
     # username sütunu artıq UNIQUE (unikal) olacaq
     c.execute('''CREATE TABLE IF NOT EXISTS users
                  (machine_id TEXT PRIMARY KEY, username TEXT UNIQUE, score INTEGER DEFAULT 0)''')
+    # Serverdə qiymətləndirilmiş hər cavab vərəqi - açar düzəldiləndə yenidən hesablamaq üçün
+    c.execute('''CREATE TABLE IF NOT EXISTS submissions
+                 (id INTEGER PRIMARY KEY, machine_id TEXT, bank TEXT, seed INTEGER, strata TEXT,
+                  answers TEXT, score INTEGER, created_at TEXT DEFAULT CURRENT_TIMESTAMP)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_users_score ON users(score)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_submissions_user ON submissions(machine_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_submissions_bank ON submissions(bank, strata)")
+    # Davam edən imtahan: vərəq seed-dən bərpa olunur, cavablar {"sual indeksi": variant} JSON obyektidir
+    c.execute('''CREATE TABLE IF NOT EXISTS exam_sessions
+                 (machine_id TEXT PRIMARY KEY, bank TEXT, seed INTEGER, strata TEXT, answers TEXT DEFAULT '{}',
+                  started_at REAL, updated_at REAL, finished INTEGER DEFAULT 0)''')
+    # Sual analizi: hər sual üçün sayğaclar və point-biserial üçün kifayət edən statistikalar
+    # (sum_t, sum_t2 - vərəqin ümumi balının cəmi və kvadratlar cəmi, sum_tc - doğru cavab verənlərin bal cəmi)
+    c.execute('''CREATE TABLE IF NOT EXISTS item_stats
+                 (bank TEXT, question_id INTEGER, shown INTEGER, answered INTEGER, correct INTEGER,
+                  sum_t REAL, sum_t2 REAL, sum_tc REAL, PRIMARY KEY (bank, question_id))''')
+    c.execute('''CREATE TABLE IF NOT EXISTS item_option_stats
+                 (bank TEXT, question_id INTEGER, option INTEGER, chosen INTEGER,
+                  PRIMARY KEY (bank, question_id, option))''')
+    # Axtarış indeksi: sual və variant mətnləri (qatlanmış), bank və sualın bankdakı indeksi
+    c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS question_fts USING fts5
+                 (question, options, bank UNINDEXED, idx UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')''')
+    # Hər indekslənmiş sualın həzmi - bank dəyişəndə yalnız fərqli suallar yenidən yazılır
+    c.execute('''CREATE TABLE IF NOT EXISTS search_docs
+                 (bank TEXT, digest TEXT, fts_rowid INTEGER, idx INTEGER, PRIMARY KEY (bank, digest))''')
+    c.execute("CREATE TABLE IF NOT EXISTS search_banks (bank TEXT PRIMARY KEY, version TEXT)")
+    # Hər cəhd (created_at - unix vaxtı, duration - saniyə, sessiya yoxdursa NULL)
+    c.execute('''CREATE TABLE IF NOT EXISTS attempts
+                 (id INTEGER PRIMARY KEY, machine_id TEXT, created_at REAL, score INTEGER, duration REAL, seed INTEGER)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_attempts_user ON attempts(machine_id, created_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_attempts_created ON attempts(created_at)")
+    # Günlük aqreqatlar (UTC günü) - cəhd yazılan tranzaksiyada yenilənir, sıxılmadan sonra da qalır
+    c.execute('''CREATE TABLE IF NOT EXISTS attempts_daily
+                 (machine_id TEXT, day TEXT, attempts INTEGER, best INTEGER, total INTEGER,
+                  timed INTEGER, total_duration REAL, PRIMARY KEY (machine_id, day))''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_attempts_daily_best ON attempts_daily(day, best)")
     conn.commit()
     conn.close()
 
 init_db()
 
-# --- PDF PARSER (Dəyişməyib) ---
+# --- YAZI NÖVBƏSİ (WRITE-BEHIND) ---
+# Sorğu yazını növbəyə qoyub dərhal cavab qaytarır; fon thread-i növbəni hər
+# WRITE_FLUSH_INTERVAL saniyədən bir boşaldır və bütün yazıları növlərinə görə
+# qruplaşdırıb bir tranzaksiyada executemany ilə tətbiq edir. Növbə doludursa
+# yazı çağıranın thread-ində dərhal icra olunur (geri təzyiq).
+_FLUSH = object()  # flush() işarəsi: fon thread-i ondan əvvəlki bütün yazıları tətbiq edəndə siqnal verir
+
+class WriteBehind:
+    def __init__(self, maxsize=WRITE_QUEUE_SIZE, interval=WRITE_FLUSH_INTERVAL, batch_size=WRITE_BATCH_SIZE):
+        self.maxsize = maxsize
+        self.interval = interval
+        self.batch_size = batch_size
+        self._handlers = {}
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._stop = threading.Event()
+        # Uğursuz olub təkrarlanacaq toplu yazı (yalnız fon thread-i dəyişir)
+        self._retry = []
+
+    def handler(self, kind, after_commit=None, on_error=None):
+        # apply(conn, items) tranzaksiya daxilində çağırılır; qaytardığı vəziyyət commit-dən sonra
+        # after_commit(items, state)-ə, tranzaksiya uğursuz olanda isə on_error(items, state)-ə ötürülür
+        def register(apply):
+            self._handlers[kind] = (apply, after_commit, on_error)
+            return apply
+        return register
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                # fork-dan sonra valideynin növbəsi və thread-i övlada keçmir
+                self._queue = queue.Queue(self.maxsize)
+                self._retry = []
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def submit(self, kind, item):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((kind, item))
+        except queue.Full:
+            metrics.inc('examsim_events_total', (('event', 'write_queue_full'),))
+            self._apply([(kind, item)])
+
+    def _drain(self, batch):
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        failures = 0
+        while not self._stop.is_set():
+            if self._retry:
+                batch, self._retry = self._drain(self._retry), []
+            else:
+                try:
+                    first = self._queue.get(timeout=self.interval)
+                except queue.Empty:
+                    continue
+                # Qısa gözləmə - eyni anda gələn yazılar bir tranzaksiyaya yığılsın
+                if first[0] is not _FLUSH:
+                    self._stop.wait(self.interval)
+                batch = self._drain([first])
+            try:
+                self._apply([entry for entry in batch if entry[0] is not _FLUSH])
+            except sqlite3.OperationalError as e:
+                # "database is locked" və s. - toplu yazı itirilmir, gözləmə artırılaraq təkrarlanır.
+                # flush() işarələri də növbədə qalır: flush yazı həqiqətən tətbiq olunana qədər gözləyir.
+                failures += 1
+                metrics.inc('examsim_events_total', (('event', 'write_retry'),))
+                app.logger.warning("Yazı növbəsi tətbiq olunmadı (%d-ci cəhd): %s", failures, e)
+                self._retry = batch
+                self._stop.wait(min(WRITE_RETRY_MAX, self.interval * 2 ** failures))
+                continue
+            except Exception as e:
+                # Proqram xətası - təkrar cəhd kömək etməz, növbə bloklanmasın
+                app.logger.exception("Yazı növbəsi tətbiq olunmadı: %s", e)
+            failures = 0
+            for kind, item in batch:
+                if kind is _FLUSH: item.set()
+
+    def _apply(self, batch):
+        if not batch:
+            return
+        metrics.inc('examsim_events_total', (('event', 'write_batch'),))
+        metrics.inc('examsim_events_total', (('event', 'write_item'),), len(batch))
+        grouped = {}
+        for kind, item in batch:
+            grouped.setdefault(kind, []).append(item)
+        conn = get_db()
+        applied = {}
+        try:
+            with conn:
+                for kind, (apply, _, _) in self._handlers.items():
+                    if kind in grouped:
+                        applied[kind] = apply(conn, grouped[kind])
+        except Exception:
+            # Tranzaksiya geri qaytarıldı - handler-lərin yaddaşdan götürdüyü vəziyyət bərpa olunur
+            for kind, state in applied.items():
+                on_error = self._handlers[kind][2]
+                if on_error: on_error(grouped[kind], state)
+            raise
+        for kind, state in applied.items():
+            after_commit = self._handlers[kind][1]
+            if after_commit: after_commit(grouped[kind], state)
+
+    def flush(self, timeout=30.0):
+        # Bu çağırışdan əvvəl növbəyə düşən (fon thread-inin artıq götürüb saxladığı da daxil)
+        # bütün yazılar tətbiq olunana qədər gözləyir
+        if self._pid != os.getpid():
+            return
+        if self._thread.is_alive() and not self._stop.is_set():
+            done = threading.Event()
+            try:
+                self._queue.put((_FLUSH, done), timeout=timeout)
+                if done.wait(timeout):
+                    return
+            except queue.Full:
+                pass
+        # Fon thread-i yoxdur (və ya cavab vermir) - qalanlar bu thread-də yazılır
+        retry = []
+        if not self._thread.is_alive():
+            retry, self._retry = self._retry, []
+        while True:
+            batch = self._drain(retry)
+            retry = []
+            if not batch: break
+            for kind, item in batch:
+                if kind is _FLUSH: item.set()
+            self._apply([entry for entry in batch if entry[0] is not _FLUSH])
+
+    def close(self):
+        if self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self.flush()
+
+write_behind = WriteBehind()
+# gunicorn worker-i düzgün dayananda (və ya Ctrl+C) növbədəki yazılar itmir
+atexit.register(write_behind.close)
+
+# Hələ bazaya yazılmamış ballar: machine_id -> [username, bazadakı bal, yeni bal].
+# Öz nəticəsinə baxan istifadəçi (read-your-writes) və liderlər lövhəsi bunları nəzərə alır.
+_pending_scores = {}
+_pending_lock = threading.Lock()
+
+def _scores_written(items, state):
+    with _pending_lock:
+        for machine_id, score in items:
+            pending = _pending_scores.get(machine_id)
+            if pending and pending[2] <= score:
+                del _pending_scores[machine_id]
+
+@write_behind.handler('score', after_commit=_scores_written)
+def _apply_scores(conn, items):
+    # Eyni machine_id-nin təkrar göndərişləri birləşdirilir - yalnız ən yüksək bal qalır
+    best = {}
+    for machine_id, score in items:
+        if score > best.get(machine_id, score - 1):
+            best[machine_id] = score
+    conn.executemany("UPDATE users SET score=? WHERE machine_id=? AND score < ?",
+                     [(score, machine_id, score) for machine_id, score in best.items()])
+
+def pending_score(machine_id, default=0):
+    with _pending_lock:
+        pending = _pending_scores.get(machine_id)
+    return max(default, pending[2]) if pending else default
+
+def pending_scores():
+    with _pending_lock:
+        return list(_pending_scores.values())
+
+# --- İMTAHAN SESSİYALARI ---
+# Autosave yalnız dəyişən cavabları göndərir. Dəltalar yaddaşda machine_id üzrə birləşdirilir
+# və növbə ilə json_patch vasitəsilə yazılır: null açarı silir (= cavabsız), ona görə müxtəlif
+# worker-lərdən gələn dəltalar bir-birinin üstünə yazılmır.
+_pending_answers = {}
+_answers_lock = threading.Lock()
+
+def _autosaves_written(items, written):
+    # Yalnız commit olunmuş dəltalar silinir; arada gələn yeni dəyişikliklər növbəyə yenidən düşür
+    requeue = []
+    with _answers_lock:
+        for machine_id, delta in written.items():
+            pending = _pending_answers.get(machine_id)
+            if pending is None: continue
+            for key, value in delta.items():
+                if key in pending and pending[key] == value:
+                    del pending[key]
+            if pending: requeue.append(machine_id)
+            else: del _pending_answers[machine_id]
+    for machine_id in requeue:
+        write_behind.submit('autosave', machine_id)
+
+@write_behind.handler('autosave', after_commit=_autosaves_written)
+def _apply_autosaves(conn, items):
+    # Dəltalar commit-ə qədər _pending_answers-də qalır (json_patch təkrar tətbiqdə eyni nəticəni verir)
+    now = time.time()
+    with _answers_lock:
+        written = {machine_id: dict(_pending_answers[machine_id]) for machine_id in set(items) if machine_id in _pending_answers}
+    conn.executemany("UPDATE exam_sessions SET answers = json_patch(answers, ?), updated_at = ? WHERE machine_id = ? AND finished = 0",
+                     [(json.dumps(delta), now, machine_id) for machine_id, delta in written.items()])
+    return written
+
+def save_answer_delta(machine_id, delta):
+    with _answers_lock:
+        pending = _pending_answers.get(machine_id)
+        if pending is None:
+            pending = _pending_answers[machine_id] = {}
+            queued = False
+        else:
+            # Bu istifadəçi üçün növbədə artıq yazı var - sadəcə birləşdiririk
+            queued = True
+        pending.update(delta)
+    if not queued:
+        write_behind.submit('autosave', machine_id)
+
+def load_session(machine_id):
+    row = get_db().execute('''SELECT bank, seed, strata, answers, started_at FROM exam_sessions
+                              WHERE machine_id = ? AND finished = 0''', (machine_id,)).fetchone()
+    if row is None:
+        return None
+    answers = json.loads(row[3])
+    with _answers_lock:
+        # Hələ yazılmamış dəltalar (read-your-writes)
+        for key, value in _pending_answers.get(machine_id, {}).items():
+            if value is None: answers.pop(key, None)
+            else: answers[key] = value
+    return {'bank': row[0], 'seed': row[1], 'strata': row[2], 'answers': answers,
+            'elapsed': max(0, int(time.time() - row[4]))}
+
+def start_session(machine_id, bank_name, strata_spec):
+    now = time.time()
+    seed = new_exam_seed()
+    conn = get_db()
+    with _answers_lock:
+        _pending_answers.pop(machine_id, None)
+    with conn:
+        conn.execute('''INSERT OR REPLACE INTO exam_sessions (machine_id, bank, seed, strata, answers, started_at, updated_at, finished)
+                        VALUES (?, ?, ?, ?, '{}', ?, ?, 0)''', (machine_id, bank_name or '', seed, strata_spec, now, now))
+    return {'bank': bank_name or '', 'seed': seed, 'strata': strata_spec, 'answers': {}, 'elapsed': 0}
+
+# --- CƏHD TARİXÇƏSİ ---
+# Hər cəhd növbə ilə toplu şəkildə attempts-ə yazılır; müddət qiymətləndirmə anında sessiyanın
+# started_at-ından hesablanır (sonrakı sessiya sətri əvəz edə bilər). Eyni tranzaksiyada yeni sətirlər (id > əvvəlki MAX(id)) günlük aqreqatlara
+# əlavə olunur. users.score bütün vaxtların ən yüksək balıdır (aqreqat), liderlər lövhəsi onu oxuyur.
+# Sıxılma yalnız ATTEMPT_RETENTION_DAYS-dən köhnə xam sətirləri silir.
+@write_behind.handler('attempt')
+def _apply_attempts(conn, items):
+    # MAX(id) oxunmazdan əvvəl yazı kilidi alınır - yoxsa digər worker-in arada yazdığı
+    # cəhdlər də "id > last_id" ilə ikinci dəfə aqreqata düşər
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM attempts").fetchone()[0]
+    conn.executemany("INSERT INTO attempts (machine_id, created_at, score, duration, seed) VALUES (?, ?, ?, ?, ?)", items)
+    conn.execute('''INSERT INTO attempts_daily (machine_id, day, attempts, best, total, timed, total_duration)
+                    SELECT machine_id, date(created_at, 'unixepoch'), COUNT(*), MAX(score), SUM(score),
+                           COUNT(duration), COALESCE(SUM(duration), 0)
+                    FROM attempts WHERE id > ? GROUP BY 1, 2
+                    ON CONFLICT (machine_id, day) DO UPDATE SET
+                      attempts = attempts + excluded.attempts, best = MAX(best, excluded.best),
+                      total = total + excluded.total, timed = timed + excluded.timed,
+                      total_duration = total_duration + excluded.total_duration''', (last_id,))
+
+def record_attempt(machine_id, score, seed=None, duration=None):
+    write_behind.submit('attempt', (machine_id, time.time(), score, duration, seed))
+
+def _regrade_attempts(conn, changes):
+    # changes: [(machine_id, seed, yeni bal)] - cəhdlər və onların günlük aqreqatları yeni ballara uyğunlaşdırılır
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS regrade_changes (machine_id TEXT, seed INTEGER, score INTEGER)")
+    conn.execute("DELETE FROM temp.regrade_changes")
+    conn.executemany("INSERT INTO temp.regrade_changes (machine_id, seed, score) VALUES (?, ?, ?)", changes)
+    rows = conn.execute('''SELECT a.id, a.machine_id, date(a.created_at, 'unixepoch'), c.score - a.score, c.score
+                           FROM temp.regrade_changes c JOIN attempts a ON a.machine_id = c.machine_id AND a.seed = c.seed''').fetchall()
+    deltas = {}
+    for _, machine_id, day, delta, _ in rows:
+        deltas[(machine_id, day)] = deltas.get((machine_id, day), 0) + delta
+    conn.executemany("UPDATE attempts SET score = ? WHERE id = ?", [(score, attempt_id) for attempt_id, _, _, _, score in rows])
+    # Günün bütün xam sətirləri qalıbsa best dəqiq yenidən hesablanır; qismən sıxılıbsa yalnız artırıla bilər
+    conn.executemany('''UPDATE attempts_daily SET total = total + ?3,
+                          best = (SELECT CASE WHEN COUNT(*) = attempts_daily.attempts THEN MAX(score)
+                                              ELSE MAX(attempts_daily.best, MAX(score)) END
+                                  FROM attempts WHERE machine_id = ?1
+                                    AND created_at >= CAST(strftime('%s', ?2) AS REAL)
+                                    AND created_at < CAST(strftime('%s', ?2, '+1 day') AS REAL))
+                        WHERE machine_id = ?1 AND day = ?2''', [(m, d, delta) for (m, d), delta in deltas.items()])
+
+def attempt_history(conn, machine_id, days=30, recent=20):
+    daily = [{'day': day, 'attempts': n, 'best': best, 'average': round(total / n, 2),
+              'duration': round(duration / timed, 1) if timed else None}
+             for day, n, best, total, timed, duration in conn.execute(
+                 '''SELECT day, attempts, best, total, timed, total_duration FROM attempts_daily
+                    WHERE machine_id = ? ORDER BY day DESC LIMIT ?''', (machine_id, days))]
+    last = [{'at': at, 'score': score, 'duration': None if duration is None else round(duration, 1), 'seed': seed}
+            for at, score, duration, seed in conn.execute(
+                '''SELECT created_at, score, duration, seed FROM attempts
+                   WHERE machine_id = ? ORDER BY created_at DESC LIMIT ?''', (machine_id, recent))]
+    return daily, last
+
+def compact_attempts(conn, retention_days=ATTEMPT_RETENTION_DAYS, chunk_size=ATTEMPT_COMPACT_CHUNK):
+    # Hissə-hissə silinir ki, yazı kilidi uzun müddət tutulmasın
+    write_behind.flush()
+    cutoff = time.time() - retention_days * 86400
+    removed = 0
+    while True:
+        with conn:
+            n = conn.execute('''DELETE FROM attempts WHERE id IN
+                                (SELECT id FROM attempts WHERE created_at < ? LIMIT ?)''', (cutoff, chunk_size)).rowcount
+        removed += n
+        if n < chunk_size:
+            return removed
+
+@app.cli.command('compact-attempts')
+@click.option('--days', default=ATTEMPT_RETENTION_DAYS, show_default=True, help='Xam cəhdlərin saxlanma müddəti (gün).')
+def compact_attempts_command(days):
+    """Köhnə xam cəhdləri silir (günlük aqreqatlar qalır); cron ilə işə salmaq üçün."""
+    removed = compact_attempts(get_db(), days)
+    click.echo(f"{removed} köhnə cəhd silindi.")
+
+# --- PDF PARSER ---
+@timed_stage('pdf_extract')
 def extract_text_from_pdf(filename):
-    text = ""
+    import PyPDF2
     try:
         with open(filename, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            for page in reader.pages:
-                page_text = page.extract_text()
-                if page_text: text += page_text + "\n"
-    except Exception as e: return None
-    return text
+            page_count = len(PyPDF2.PdfReader(file).pages)
+        if page_count <= PARALLEL_PAGE_THRESHOLD or (os.cpu_count() or 1) < 2:
+            return extract_page_range(filename, 0, page_count)
+
+        ranges = [(a, min(a + PAGES_PER_TASK, page_count)) for a in range(0, page_count, PAGES_PER_TASK)]
+        # fork deyil: sorğu thread-indən çağırılır, prosesdə isə fon thread-ləri (yazı növbəsi, profiler)
+        # işləyir - onların tutduğu kilid övlad prosesdə əbədi bağlı qala bilər
+        with ProcessPoolExecutor(mp_context=multiprocessing.get_context('forkserver')) as pool:
+            chunks = pool.map(extract_page_range, [filename] * len(ranges), *zip(*ranges))
+            return "".join(chunks)
+    except Exception as e:
+        app.logger.warning("'%s' oxunmadı: %s", filename, e)
+        return None
+
+# Sətirlər bir keçiddə təsnif olunur. Regex yalnız rəqəmlə başlayan sətirlərdə
+# (mümkün sual başlığı) işə düşür; bullet və doğru cavab işarələri C səviyyəli
+# str metodları ilə yoxlanılır - sətir başına regex çağırışı bunlardan baha başa gəlir.
+_QUESTION_RE = re.compile(r'(\d+)\s*[\.\)\-]\s*(.*)')
+# re-dəki \s ilə eyni boşluq simvolları (hamısı U+3000-dən kiçikdir) + bullet-lər
+_OPTION_PREFIX_CHARS = '•-*).' + ''.join(c for c in map(chr, range(0x3001)) if c.isspace())
+_BULLET_MARKERS = ('•', '●', '-', '*', ')')
 
+def _build_question(qid, text_parts, options):
+    return {'id': qid, 'text': " ".join(text_parts),
+            'options': [{'text': " ".join(parts), 'isCorrect': is_correct} for parts, is_correct in options]}
+
+@timed_stage('parse')
 def parse_quiz_content(text):
     questions = []
-    lines = text.split('\n')
-    current_question = None
-    question_start_regex = re.compile(r'^\s*(\d+)\s*[\.\)\-]\s*(.*)')
-    correct_markers = ['✔', '√', '+', '✓'] 
-    bullet_markers = ['•', '●', '-', '*', ')']
+    qid = None
+    text_parts = options = None
+    match_question = _QUESTION_RE.match
 
-    for line in lines:
+    for line in text.split('\n'):
         line = line.strip()
         if not line or '--- PAGE' in line or 'Fənn:' in line: continue
-        q_match = question_start_regex.match(line)
+        q_match = match_question(line) if line[0].isdecimal() else None
         if q_match:
-            if current_question and len(current_question['options']) > 0:
-                questions.append(current_question)
-            current_question = {'id': int(q_match.group(1)), 'text': q_match.group(2).strip(), 'options': []}
-        elif current_question:
-            is_correct = any(marker in line for marker in correct_markers)
-            is_option_line = is_correct or any(line.startswith(b) for b in bullet_markers)
-            if not current_question['options'] and not is_option_line:
-                 current_question['text'] += " " + line
+            if options:
+                questions.append(_build_question(qid, text_parts, options))
+            qid, text_parts, options = int(q_match.group(1)), [q_match.group(2).strip()], []
+        elif qid is not None:
+            is_correct = '√' in line or '+' in line or '✔' in line or '✓' in line
+            is_option_line = is_correct or line.startswith(_BULLET_MARKERS)
+            if not options and not is_option_line:
+                text_parts.append(line)
+            elif not is_option_line and options and (line[0].islower() or line[0] in ',;:'):
+                # Əvvəlki variantın davamı
+                options[-1][0].append(line)
             else:
-                is_continuation = not is_option_line and (len(line) > 0 and (line[0].islower() or line[0] in [',', ';', ':']))
-                if is_continuation and current_question['options']:
-                    current_question['options'][-1]['text'] += " " + line
-                else:
-                    option_text = line
-                    for marker in correct_markers: option_text = option_text.replace(marker, '')
-                    option_text = re.sub(r'^[\s•\-\*\)\.]+', '', option_text).strip()
-                    if option_text and not re.match(r'^\d+\.$', option_text):
-                        current_question['options'].append({'text': option_text, 'isCorrect': is_correct})
-    if current_question and len(current_question['options']) > 0:
-        questions.append(current_question)
+                option_text = line
+                if is_correct:
+                    option_text = option_text.replace('✔', '').replace('√', '').replace('+', '').replace('✓', '')
+                option_text = option_text.lstrip(_OPTION_PREFIX_CHARS).rstrip()
+                if option_text and not (option_text[-1] == '.' and option_text[:-1].isdecimal()):
+                    options.append(([option_text], is_correct))
+    if options:
+        questions.append(_build_question(qid, text_parts, options))
     return questions
 
+# --- SUAL BANKI (KEŞ) ---
+# PDF yalnız bir dəfə oxunur. Açar: (yol, mtime, ölçü, sha256). Fayl dəyişməyibsə
+# keşdəki bank qaytarılır, eyni anda gələn ilk sorğular isə tək bir qurulmanı gözləyir.
+class QuestionBank:
+    def __init__(self, path, key, questions, text):
+        self.path = path
+        self.key = key
+        self.questions = questions
+        self.readable = bool(text)
+        self.debug_snippet = text[:500] if text else "Mətn boşdur"
+        self._answer_key = None
+
+    def __len__(self):
+        return len(self.questions)
+
+    def question(self, i):
+        return self.questions[i]
+
+    def question_id(self, i):
+        return self.questions[i]['id']
+
+    def option_count(self, i):
+        return len(self.questions[i]['options'])
+
+    def answer_key(self):
+        # Hər sual üçün doğru variantın orijinal indeksi (-1: işarələnməyib)
+        if self._answer_key is None:
+            key = array('h')
+            for q in self.questions:
+                key.append(next((j for j, o in enumerate(q['options']) if o['isCorrect']), -1))
+            self._answer_key = key
+        return self._answer_key
+
+# Kompilyasiya olunmuş bank faylının formatı (little-endian):
+#   başlıq    : magic, versiya, bayraqlar, sual sayı (n), variant sayı (m), mənbə PDF-in sha256-sı
+#   sual cədv.: (n+1) x (id, ilk variantın qlobal indeksi) - sonuncu sətir sərhəddir
+#   ofsetlər  : (n+m+1) x blob ofseti - əvvəlcə n sual mətni, sonra m variant mətni
+#   bitlər    : ceil(m/8) bayt, j-ci variant doğrudursa j-ci bit 1-dir
+#   blob      : UTF-8 mətnlər ardıcıl
+BANK_MAGIC = b'QBNK'
+BANK_VERSION = 1
+_BANK_HEADER = struct.Struct('<4sHHII32s')
+
+class MappedQuestionBank:
+    readable = True
+    debug_snippet = ''
+
+    def __init__(self, path, st):
+        with open(path, 'rb') as f:
+            # mmap səhifələri ƏS tərəfindən bütün gunicorn worker-ləri arasında paylaşılır
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _flags, n, m, digest = _BANK_HEADER.unpack_from(self._mm, 0)
+        if magic != BANK_MAGIC or version != BANK_VERSION:
+            raise ValueError(f"'{path}' sual bankı faylı deyil və ya versiyası uyğun gəlmir.")
+        self.path = path
+        self.key = (path, st.st_mtime_ns, st.st_size, digest.hex())
+        self._n = n
+        self._qtable = _BANK_HEADER.size
+        self._offsets = self._qtable + (n + 1) * 8
+        self._bits = self._offsets + (n + m + 1) * 4
+        self._blob = self._bits + (m + 7) // 8
+        # Yarımçıq yazılmış/kəsilmiş fayl: cədvəllər və ya mətn bloku faylın sonundan kənara çıxır
+        if len(self._mm) < self._blob or len(self._mm) < self._blob + struct.unpack_from('<I', self._mm, self._bits - 4)[0]:
+            raise ValueError(f"'{path}' sual bankı faylı natamamdır.")
+        self._answer_key = None
+
+    def __len__(self):
+        return self._n
+
+    def _string(self, k):
+        a, b = struct.unpack_from('<II', self._mm, self._offsets + k * 4)
+        return self._mm[self._blob + a:self._blob + b].decode('utf-8')
+
+    def question(self, i):
+        qid, first, _, last = struct.unpack_from('<IIII', self._mm, self._qtable + i * 8)
+        options = []
+        for j in range(first, last):
+            is_correct = bool(self._mm[self._bits + (j >> 3)] & (1 << (j & 7)))
+            options.append({'text': self._string(self._n + j), 'isCorrect': is_correct})
+        return {'id': qid, 'text': self._string(i), 'options': options}
+
+    def question_id(self, i):
+        return struct.unpack_from('<I', self._mm, self._qtable + i * 8)[0]
+
+    def option_count(self, i):
+        _, first, _, last = struct.unpack_from('<IIII', self._mm, self._qtable + i * 8)
+        return last - first
+
+    def answer_key(self):
+        if self._answer_key is None:
+            table = struct.unpack_from(f'<{2 * (self._n + 1)}I', self._mm, self._qtable)
+            bits = self._mm[self._bits:self._blob]
+            key = array('h')
+            for i in range(self._n):
+                first, last = table[2 * i + 1], table[2 * i + 3]
+                key.append(next((j - first for j in range(first, last) if bits[j >> 3] & (1 << (j & 7))), -1))
+            self._answer_key = key
+        return self._answer_key
+
+def write_compiled_bank(questions, digest, out_path):
+    n = len(questions)
+    qtable, offsets, strings, flags = [], [0], [], []
+    for q in questions:
+        qtable.append((q['id'], len(flags)))
+        flags.extend(o['isCorrect'] for o in q['options'])
+    qtable.append((0, len(flags)))
+    strings.extend(q['text'].encode('utf-8') for q in questions)
+    strings.extend(o['text'].encode('utf-8') for q in questions for o in q['options'])
+    for b in strings:
+        offsets.append(offsets[-1] + len(b))
+    bits = bytearray((len(flags) + 7) // 8)
+    for j, flag in enumerate(flags):
+        if flag: bits[j >> 3] |= 1 << (j & 7)
+
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_BANK_HEADER.pack(BANK_MAGIC, BANK_VERSION, 0, n, len(flags), bytes.fromhex(digest)))
+        f.write(b''.join(struct.pack('<II', *row) for row in qtable))
+        f.write(struct.pack(f'<{len(offsets)}I', *offsets))
+        f.write(bits)
+        f.write(b''.join(strings))
+    # Atomar əvəzləmə: işləyən worker-lər köhnə faylın mmap-ını saxlayır, yeniləri yenisini açır
+    os.replace(tmp_path, out_path)
+
+_bank_cache = {}
+_bank_locks = {}
+_bank_locks_guard = threading.Lock()
+
+def _file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _bank_lock_for(path):
+    with _bank_locks_guard:
+        lock = _bank_locks.get(path)
+        if lock is None:
+            lock = _bank_locks[path] = threading.Lock()
+        return lock
+
+def _build_pdf_bank(path, st, previous):
+    digest = _file_sha256(path)
+    key = (path, st.st_mtime_ns, st.st_size, digest)
+    if previous is not None and previous.key[3] == digest:
+        # Yalnız mtime dəyişib (məs. touch/kopyalama) - yenidən parse etməyə ehtiyac yoxdur
+        previous.key = key
+        return previous
+    metrics.inc('examsim_events_total', (('event', 'bank_build'),))
+    text = extract_text_from_pdf(path)
+    questions = parse_quiz_content(text) if text else []
+    return QuestionBank(path, key, questions, text)
+
+def _open_compiled_bank(path, st, previous):
+    return MappedQuestionBank(path, st)
+
+def _cached_bank(path, build):
+    path = os.path.abspath(path)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    stamp = (st.st_mtime_ns, st.st_size)
+
+    bank = _bank_cache.get(path)
+    if bank is not None and bank.key[1:3] == stamp:
+        return bank
+
+    with _bank_lock_for(path):
+        # Kilidi gözləyərkən başqa thread artıq qurmuş ola bilər
+        bank = _bank_cache.get(path)
+        if bank is not None and bank.key[1:3] == stamp:
+            return bank
+        bank = build(path, st, bank)
+        # Oxunmayan və ya boş nəticə keşlənmir - növbəti sorğu yenidən cəhd edir
+        # (məs. proses hovuzu müvəqqəti xəta verib); fayl dəyişənə qədər ilişib qalmır
+        if len(bank):
+            _bank_cache[path] = bank
+        return bank
+
+_stale_checks = {}
+
+def _compiled_bank_stale(bank, pdf_path):
+    # PDF .qbank-dan sonra dəyişibsə başlıqdakı mənbə sha256-sı ilə müqayisə olunur;
+    # nəticə (PDF ştampı, bank açarı) üzrə yadda saxlanılır - hər sorğuda hash hesablanmır
+    try:
+        st = os.stat(pdf_path)
+    except OSError:
+        return False
+    if st.st_mtime_ns <= bank.key[1]:
+        return False
+    check = (os.path.abspath(pdf_path), st.st_mtime_ns, st.st_size, bank.key)
+    stale = _stale_checks.get(check)
+    if stale is None:
+        stale = _stale_checks[check] = _file_sha256(pdf_path) != bank.key[3]
+        if stale:
+            app.logger.warning("'%s' '%s'-dən köhnədir - PDF-dən oxunur (flask compile-bank ilə yeniləyin).",
+                               bank.path, pdf_path)
+    return stale
+
+_broken_banks = set()
+
+def get_question_bank(pdf_path, bank_path=None):
+    if bank_path:
+        try:
+            bank = _cached_bank(bank_path, _open_compiled_bank)
+        except (ValueError, struct.error, OSError) as e:
+            # Zədələnmiş/boş .qbank - köhnə bank kimi PDF-dən oxunur; xəbərdarlıq fayl versiyası üzrə bir dəfə
+            bank = None
+            try:
+                st = os.stat(bank_path)
+                broken = (os.path.abspath(bank_path), st.st_mtime_ns, st.st_size)
+            except OSError:
+                broken = None
+            if broken not in _broken_banks:
+                _broken_banks.add(broken)
+                app.logger.warning("'%s' oxunmadı (%s) - PDF-dən oxunur (flask compile-bank ilə yeniləyin).", bank_path, e)
+        if bank is not None and not _compiled_bank_stale(bank, pdf_path):
+            return bank
+    return _cached_bank(pdf_path, _build_pdf_bank)
+
+_BANK_NAME_RE = re.compile(r'^[\w\-]+$')
+
+def list_bank_names(directory=BANKS_DIR):
+    try:
+        entries = os.listdir(directory)
+    except OSError:
+        return []
+    names = {os.path.splitext(e)[0] for e in entries if e.endswith(('.pdf', '.qbank'))}
+    return sorted(n for n in names if _BANK_NAME_RE.match(n))
+
+def bank_paths(name, directory=BANKS_DIR):
+    if not name:
+        return PDF_FILENAME, BANK_FILENAME
+    if not _BANK_NAME_RE.match(name):
+        return None
+    base = os.path.join(directory, name)
+    return base + '.pdf', base + '.qbank'
+
+def get_named_bank(name, directory=BANKS_DIR):
+    paths = bank_paths(name, directory)
+    return get_question_bank(*paths) if paths else None
+
+def load_banks(directory=BANKS_DIR):
+    # Qovluqdakı bütün bankları əvvəlcədən yükləyir (məs. worker başlayanda isitmək üçün)
+    banks = {}
+    for name in list_bank_names(directory):
+        bank = get_named_bank(name, directory)
+        if bank is not None:
+            banks[name] = bank
+    return banks
+
+@app.cli.command('compile-bank')
+@click.argument('pdf', default=PDF_FILENAME)
+@click.argument('output', default=BANK_FILENAME)
+def compile_bank_command(pdf, output):
+    """PDF-i mmap ilə açılan ikili sual bankına çevirir."""
+    text = extract_text_from_pdf(pdf)
+    if not text:
+        raise click.ClickException(f"'{pdf}' faylından mətn oxuna bilmədi.")
+    questions = parse_quiz_content(text)
+    if not questions:
+        raise click.ClickException("Suallar tapılmadı.")
+    write_compiled_bank(questions, _file_sha256(pdf), output)
+    click.echo(f"{len(questions)} sual '{output}' faylına yazıldı ({os.path.getsize(output)} bayt).")
+
+@app.cli.command('compile-banks')
+@click.argument('directory', default=BANKS_DIR)
+@click.pass_context
+def compile_banks_command(ctx, directory):
+    """Qovluqdakı hər <ad>.pdf faylını yanında <ad>.qbank-a çevirir."""
+    for name in list_bank_names(directory):
+        pdf, output = bank_paths(name, directory)
+        if os.path.exists(pdf):
+            ctx.invoke(compile_bank_command, pdf=pdf, output=output)
+
+# --- AXTARIŞ (FTS5) ---
+# Məşq rejimi üçün bankın sual və variant mətnləri FTS5-də indekslənir. unicode61 remove_diacritics 2
+# ç/ö/ü/ş/ğ/İ-ni sadələşdirir; ə və ı diakritik sayılmadığı üçün həm mətn, həm sorğu əvvəlcədən
+# qatlanır. Bank versiyası (sha256) dəyişəndə hər sualın həzmi müqayisə olunur və yalnız
+# əlavə olunan/dəyişən/silinən suallar indeksə yazılır.
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 50
+_SEARCH_FOLD = str.maketrans({'ə': 'e', 'Ə': 'e', 'ı': 'i'})
+_SEARCH_TOKEN_RE = re.compile(r'\w+')
+_indexed_versions = {}
+_index_lock = threading.Lock()
+
+def _search_doc(q):
+    question = q['text'].translate(_SEARCH_FOLD)
+    options = ' '.join(o['text'] for o in q['options']).translate(_SEARCH_FOLD)
+    digest = hashlib.sha1(f"{q['id']}\0{question}\0{options}".encode('utf-8')).hexdigest()
+    return digest, question, options
+
+def ensure_search_index(conn, bank_name, bank):
+    version = bank.key[3]
+    if _indexed_versions.get(bank_name) == version:
+        return 0
+    with _index_lock:
+        if _indexed_versions.get(bank_name) == version:
+            return 0
+        # IMMEDIATE: eyni anda indeksləyən worker-lər bir-birini gözləyir, ikincisi versiyanı hazır görür
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT version FROM search_banks WHERE bank = ?", (bank_name,)).fetchone()
+            changed = 0
+            if row is None or row[0] != version:
+                changed = _reindex_bank(conn, bank_name, bank)
+                conn.execute("INSERT OR REPLACE INTO search_banks (bank, version) VALUES (?, ?)", (bank_name, version))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        _indexed_versions[bank_name] = version
+        return changed
+
+def _reindex_bank(conn, bank_name, bank):
+    existing = {digest: (rowid, idx) for digest, rowid, idx in
+                conn.execute("SELECT digest, fts_rowid, idx FROM search_docs WHERE bank = ?", (bank_name,))}
+    docs = {}
+    for i in range(len(bank)):
+        digest, question, options = _search_doc(bank.question(i))
+        docs.setdefault(digest, (i, question, options))  # eyni sualın təkrarı bir dəfə indekslənir
+    removed = [existing[d][0] for d in existing.keys() - docs.keys()]
+    conn.executemany("DELETE FROM question_fts WHERE rowid = ?", [(r,) for r in removed])
+    conn.executemany("DELETE FROM search_docs WHERE bank = ? AND digest = ?", [(bank_name, d) for d in existing.keys() - docs.keys()])
+    # Dəyişməyən, amma bankda yeri sürüşən suallar
+    moved = [(docs[d][0], existing[d][0]) for d in existing.keys() & docs.keys() if existing[d][1] != docs[d][0]]
+    conn.executemany("UPDATE question_fts SET idx = ? WHERE rowid = ?", moved)
+    conn.executemany("UPDATE search_docs SET idx = ? WHERE fts_rowid = ?", moved)
+    added = 0
+    for digest in docs.keys() - existing.keys():
+        i, question, options = docs[digest]
+        rowid = conn.execute("INSERT INTO question_fts (question, options, bank, idx) VALUES (?, ?, ?, ?)",
+                             (question, options, bank_name, i)).lastrowid
+        conn.execute("INSERT INTO search_docs (bank, digest, fts_rowid, idx) VALUES (?, ?, ?, ?)", (bank_name, digest, rowid, i))
+        added += 1
+    return added + len(removed) + len(moved)
+
+def search_query(text):
+    # Hər söz prefiks kimi axtarılır ("yaddaş" -> "yaddas"*), sözlər AND ilə birləşir
+    tokens = _SEARCH_TOKEN_RE.findall(text.translate(_SEARCH_FOLD))
+    return ' '.join(f'"{t}"*' for t in tokens)
+
+def search_bank(conn, bank_name, bank, text, page=1, per_page=SEARCH_PAGE_SIZE):
+    query = search_query(text)
+    if not query:
+        return [], False
+    ensure_search_index(conn, bank_name, bank)
+    # Sual mətnindəki uyğunluq variantlardakından iki dəfə ağır sayılır
+    rows = conn.execute('''SELECT idx FROM question_fts WHERE question_fts MATCH ? AND bank = ?
+                           ORDER BY bm25(question_fts, 2.0, 1.0) LIMIT ? OFFSET ?''',
+                        (query, bank_name, per_page + 1, (page - 1) * per_page)).fetchall()
+    results = []
+    for (i,) in rows[:per_page]:
+        q = bank.question(i)
+        # Doğru cavab göndərilmir - axtarış imtahan zamanı açarı açmamalıdır
+        results.append({'id': q['id'], 'text': q['text'], 'options': [o['text'] for o in q['options']]})
+    return results, len(rows) > per_page
+
+@app.cli.command('index-banks')
+def index_banks_command():
+    """Bütün sual banklarının axtarış indeksini yeniləyir (yalnız dəyişən suallar)."""
+    conn = get_db()
+    banks = load_banks()
+    default = get_named_bank(None)
+    if default is not None:
+        banks[''] = default
+    for name, bank in banks.items():
+        changed = ensure_search_index(conn, name, bank)
+        click.echo(f"{name or PDF_FILENAME}: {len(bank)} sual, {changed} dəyişiklik.")
+
+# --- İMTAHAN GENERASİYASI ---
+# İmtahan bankdakı obyektlərə toxunmur: yalnız sual indeksləri və hər sual üçün
+# variant permutasiyası saxlanılır. Hamısı toxumdan (seed) yaradılır, ona görə
+# eyni bank + eyni seed həmişə eyni vərəqi verir - vərəqi saxlamağa ehtiyac yoxdur.
+Exam = namedtuple('Exam', 'seed questions options')
+
+def new_exam_seed():
+    # 48 bit - JavaScript Number-da itkisiz saxlanılır
+    return secrets.randbits(48)
+
+def parse_strata(spec):
+    # "5" -> 5 bərabər bölmə, "1-200,201-400" -> ID aralıqları; səhv formatda ValueError
+    if spec is None or isinstance(spec, int):
+        return spec
+    spec = str(spec).strip()
+    if not spec:
+        return None
+    if spec.isdigit():
+        return int(spec)
+    ranges = []
+    for part in spec.split(','):
+        lo, sep, hi = part.partition('-')
+        if not sep:
+            raise ValueError(part)
+        ranges.append((int(lo), int(hi)))
+    return ranges
+
+def _strata_indices(bank, strata):
+    n = len(bank)
+    if not strata:
+        return [range(n)]
+    if isinstance(strata, int):
+        # Bank ardıcıllığı ilə bərabər bölmələr (PDF-də mövzular ardıcıl gəlir)
+        k = max(1, min(strata, n))
+        return [range(n * s // k, n * (s + 1) // k) for s in range(k)]
+    groups = [[] for _ in strata]
+    for i in range(n):
+        qid = bank.question_id(i)
+        for g, (lo, hi) in enumerate(strata):
+            if lo <= qid <= hi:
+                groups[g].append(i)
+                break
+    return [g for g in groups if g]
+
+def _allocate(sizes, count):
+    # Ölçüyə mütənasib paylama (ən böyük qalıq üsulu), heç bir bölmə ölçüsünü aşmır
+    total = sum(sizes)
+    if not total:
+        return [0] * len(sizes)
+    count = min(count, total)
+    quotas = [count * size / total for size in sizes]
+    alloc = [int(q) for q in quotas]
+    by_remainder = sorted(range(len(sizes)), key=lambda g: quotas[g] - alloc[g], reverse=True)
+    for g in by_remainder[:count - sum(alloc)]:
+        alloc[g] += 1
+    return alloc
+
+@timed_stage('sampling')
+def build_exam(bank, seed, count=EXAM_SIZE, strata=None):
+    rng = random.Random(seed)
+    groups = _strata_indices(bank, strata)
+    picked = []
+    for group, k in zip(groups, _allocate([len(g) for g in groups], count)):
+        picked.extend(rng.sample(group, k))
+    rng.shuffle(picked)
+    options = []
+    for i in picked:
+        order = list(range(bank.option_count(i)))
+        rng.shuffle(order)
+        options.append(order)
+    return Exam(seed, picked, options)
+
+@timed_stage('render_exam')
+def render_exam(bank, exam):
+    selected_questions = []
+    for i, order in zip(exam.questions, exam.options):
+        q = bank.question(i)
+        # Doğru cavab müştəriyə göndərilmir - qiymətləndirmə serverdə (/api/grade) aparılır
+        options = [{'text': q['options'][j]['text']} for j in order]
+        selected_questions.append({'id': q['id'], 'text': q['text'], 'options': options, 'original_id': q['id']})
+    return selected_questions
+
+# --- QİYMƏTLƏNDİRMƏ ---
+# Cavablar vərəqdə göstərilən variant indeksləridir (null = boş). Onlar orijinal
+# indekslərə çevrilib bütün bankın cavab açarı ilə bir keçiddə müqayisə olunur.
+_EMPTY_ANSWER = -2  # açardakı -1 (doğru variant yoxdur) ilə heç vaxt üst-üstə düşmür
+
+@timed_stage('grading')
+def grade_many(bank, exams, answers_list):
+    key = bank.answer_key()
+    chosen, expected, bounds = array('h'), array('h'), [0]
+    for exam, answers in zip(exams, answers_list):
+        chosen.extend(order[a] if type(a) is int and 0 <= a < len(order) else _EMPTY_ANSWER
+                      for order, a in zip(exam.options, answers))
+        chosen.extend([_EMPTY_ANSWER] * (len(exam.options) - len(answers)))
+        expected.extend(key[i] for i in exam.questions)
+        bounds.append(len(chosen))
+    hits = bytes(map(operator.eq, chosen, expected))
+    return [(sum(hits[a:b]), hits[a:b], chosen[a:b]) for a, b in zip(bounds, bounds[1:])]
+
+def grade_exam(bank, exam, answers, graded=None):
+    score, hits, chosen = graded or grade_many(bank, [exam], [answers])[0]
+    key = bank.answer_key()
+    results = []
+    for i, order, hit, c in zip(exam.questions, exam.options, hits, chosen):
+        status = 'empty' if c == _EMPTY_ANSWER else 'correct' if hit else 'wrong'
+        results.append({'status': status, 'correct': order.index(key[i]) if key[i] >= 0 else -1})
+    empty = sum(1 for r in results if r['status'] == 'empty')
+    return {'score': score, 'correct': score, 'wrong': len(results) - score - empty, 'empty': empty, 'results': results}
+
+def regrade_submissions(conn, chunk_size=5000):
+    # Bütün saxlanılmış vərəqləri yenidən hesablayır; (bank, strata) qrupları bir dəfəyə qiymətləndirilir.
+    # Qiymətləndirmə yazı kilidi olmadan aparılır, dəyişikliklər sonda bir qısa tranzaksiyada yazılır -
+    # yoxsa uzun regrade zamanı digər yazanlar busy_timeout-u keçib "database is locked" alır.
+    write_behind.flush()
+    # Sual statistikaları da yeni açarla sıfırdan qurulur
+    counts, option_counts = {}, Counter()
+    updates, changes = [], []
+    read = conn.execute("SELECT id, bank, seed, strata, answers, score, machine_id FROM submissions ORDER BY bank, strata")
+    while True:
+        rows = read.fetchmany(chunk_size)
+        if not rows: break
+        groups = {}
+        for row in rows:
+            groups.setdefault((row[1], row[3]), []).append(row)
+        for (bank_name, strata), group in groups.items():
+            bank = get_named_bank(bank_name)
+            if bank is None or not len(bank): continue
+            strata = parse_strata(strata)
+            exams = [build_exam(bank, row[2], strata=strata) for row in group]
+            graded = grade_many(bank, exams, [json.loads(row[4]) for row in group])
+            updates.extend((score, row[0]) for row, (score, _, _) in zip(group, graded) if score != row[5])
+            changes.extend((row[6], row[2], score) for row, (score, _, _) in zip(group, graded) if score != row[5])
+            for row, exam, result in zip(group, exams, graded):
+                _count_items(counts, option_counts, bank_name, bank, exam, result)
+    # Xəta olarsa hamısı geri qaytarılır - bağlantı yarımçıq yazı tranzaksiyasında qalmır
+    with conn:
+        conn.executemany("UPDATE submissions SET score=? WHERE id=?", updates)
+        conn.execute('''UPDATE users SET score = (SELECT MAX(s.score) FROM submissions s WHERE s.machine_id = users.machine_id)
+                        WHERE machine_id IN (SELECT machine_id FROM submissions)''')
+        _regrade_attempts(conn, changes)
+        conn.execute("DELETE FROM item_stats")
+        conn.execute("DELETE FROM item_option_stats")
+        _write_item_counts(conn, counts, option_counts)
+    # Ballar azala da bilər - artımlı yeniləmə bunu əks etdirmir
+    leaderboard.invalidate()
+    return len(updates)
+
+def admin_required(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        token = request.headers.get('X-Admin-Token', '')
+        if not ADMIN_TOKEN or not secrets.compare_digest(token, ADMIN_TOKEN):
+            return jsonify({'error': 'İcazə yoxdur.'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.cli.command('regrade')
+def regrade_command():
+    """Cavab açarı düzəldildikdən sonra bütün vərəqləri yenidən qiymətləndirir."""
+    changed = regrade_submissions(get_db())
+    click.echo(f"{changed} vərəqin balı dəyişdi.")
+
+# --- SUAL ANALİZİ ---
+# Hər qiymətləndirilmiş vərəq sual id-si üzrə sayğacları yaddaşda artırır (göstərilib, cavablanıb,
+# doğru, variant histoqramı); yazı növbəsi onları bir tranzaksiyada toplu upsert ilə bazaya əlavə edir.
+# Çətinlik (p) və diskriminasiya (düzəldilmiş point-biserial: sualın özü çıxılmış balla korrelyasiya)
+# bu cəmlərdən birbaşa SQL-də, bütün bank üçün bir sorğu ilə hesablanır.
+_item_counts = {}  # (bank, question_id) -> [shown, answered, correct, sum_t, sum_t2, sum_tc]
+_option_counts = Counter()  # (bank, question_id, orijinal variant indeksi) -> seçilmə sayı
+_item_lock = threading.Lock()
+_item_queued = False
+
+def _count_items(counts, option_counts, bank_name, bank, exam, graded):
+    score, hits, chosen = graded
+    for i, hit, c in zip(exam.questions, hits, chosen):
+        key = (bank_name, bank.question_id(i))
+        row = counts.get(key)
+        if row is None:
+            row = counts[key] = [0, 0, 0, 0, 0, 0]
+        row[0] += 1
+        row[3] += score
+        row[4] += score * score
+        if c != _EMPTY_ANSWER:
+            row[1] += 1
+            option_counts[key + (c,)] += 1
+        if hit:
+            row[2] += 1
+            row[5] += score
+
+def _write_item_counts(conn, counts, option_counts):
+    conn.executemany('''INSERT INTO item_stats (bank, question_id, shown, answered, correct, sum_t, sum_t2, sum_tc)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (bank, question_id) DO UPDATE SET
+                          shown = shown + excluded.shown, answered = answered + excluded.answered,
+                          correct = correct + excluded.correct, sum_t = sum_t + excluded.sum_t,
+                          sum_t2 = sum_t2 + excluded.sum_t2, sum_tc = sum_tc + excluded.sum_tc''',
+                     [key + tuple(row) for key, row in counts.items()])
+    conn.executemany('''INSERT INTO item_option_stats (bank, question_id, option, chosen) VALUES (?, ?, ?, ?)
+                        ON CONFLICT (bank, question_id, option) DO UPDATE SET chosen = chosen + excluded.chosen''',
+                     [key + (n,) for key, n in option_counts.items()])
+
+def _restore_item_stats(items, taken):
+    # Tranzaksiya geri qaytarıldı - götürülmüş sayğaclar yenidən yaddaşa əlavə olunur
+    counts, option_counts = taken
+    with _item_lock:
+        for key, row in counts.items():
+            current = _item_counts.get(key)
+            if current is None: _item_counts[key] = row
+            else: current[:] = map(operator.add, current, row)
+        _option_counts.update(option_counts)
+
+@write_behind.handler('item_stats', on_error=_restore_item_stats)
+def _apply_item_stats(conn, items):
+    global _item_counts, _option_counts, _item_queued
+    with _item_lock:
+        counts, option_counts = _item_counts, _option_counts
+        _item_counts, _option_counts, _item_queued = {}, Counter(), False
+    try:
+        _write_item_counts(conn, counts, option_counts)
+    except Exception:
+        _restore_item_stats(items, (counts, option_counts))
+        raise
+    return counts, option_counts
+
+def record_item_stats(bank_name, bank, exam, graded):
+    global _item_queued
+    with _item_lock:
+        _count_items(_item_counts, _option_counts, bank_name, bank, exam, graded)
+        queued, _item_queued = _item_queued, True
+    # Növbədə bir işarə kifayətdir - handler yığılmış bütün sayğacları götürür
+    if not queued:
+        write_behind.submit('item_stats', None)
+
+def item_analysis(conn, bank_name, bank):
+    # Fon thread-i işarəni artıq götürmüş ola bilər - bu worker-in sayğacları burada birbaşa yazılır
+    taken = ({}, Counter())
+    try:
+        with conn:
+            taken = _apply_item_stats(conn, None)
+    except Exception:
+        _restore_item_stats(None, taken)
+        raise
+    rows = conn.execute('''SELECT question_id, shown, answered, correct, p,
+                                  CASE WHEN correct > 0 AND correct < shown AND var_r > 1e-12
+                                       THEN (sum_rc / correct - sum_r / shown) / sqrt(var_r)
+                                            * sqrt(CAST(correct AS REAL) / (shown - correct)) END
+                           FROM (SELECT question_id, shown, answered, correct,
+                                        CAST(correct AS REAL) / shown AS p,
+                                        sum_t - correct AS sum_r, sum_tc - correct AS sum_rc,
+                                        (sum_t2 - 2 * sum_tc + correct) / shown
+                                          - ((sum_t - correct) / shown) * ((sum_t - correct) / shown) AS var_r
+                                 FROM item_stats WHERE bank = ? AND shown > 0)
+                           ORDER BY question_id''', (bank_name,)).fetchall()
+    histograms = {}
+    for qid, option, chosen in conn.execute("SELECT question_id, option, chosen FROM item_option_stats WHERE bank = ?", (bank_name,)):
+        histograms.setdefault(qid, {})[option] = chosen
+    key = bank.answer_key()
+    index = {bank.question_id(i): i for i in range(len(bank))}
+    items = []
+    for qid, shown, answered, correct, p, discrimination in rows:
+        options = histograms.get(qid, {})
+        i = index.get(qid)
+        items.append({'id': qid, 'shown': shown, 'answered': answered, 'correct': correct,
+                      'difficulty': round(p, 4), 'discrimination': None if discrimination is None else round(discrimination, 4),
+                      'key': None if i is None else key[i],
+                      'options': [options.get(j, 0) for j in range(bank.option_count(i) if i is not None else max(options, default=-1) + 1)],
+                      # Mənfi diskriminasiya: güclü namizədlər "səhv" cavab verir - açar çox güman ki, yanlışdır
+                      'suspect': discrimination is not None and discrimination < 0})
+    return items
+
+# --- KOMPAKT CAVAB FORMATI ---
+# /api/questions?format=compact -> {"v": bank versiyası, "s": seed, "q": [[id, mətn, [variantlar]], ...]}
+# Hər sualın və variantın JSON baytları bank versiyası üzrə bir dəfə kodlanıb keşlənir;
+# vərəq yalnız bu hazır parçaları permutasiyaya görə birləşdirməklə qurulur.
+COMPACT_CACHE_BANKS = 8
+# Bundan kiçik cavablar sıxılmır
+COMPRESS_MIN_SIZE = 1024
+
+def dumps_json(obj):
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+class _BankFragments:
+    def __init__(self, bank):
+        self.bank = bank
+        self.version = bank.key[3][:12]
+        self._questions = [None] * len(bank)
+
+    def get(self, i):
+        frag = self._questions[i]
+        if frag is None:
+            q = self.bank.question(i)
+            head = dumps_json([q['id'], q['text']])[:-1]  # '[id,"mətn"' - bağlanmamış massiv
+            frag = self._questions[i] = (head, [dumps_json(o['text']) for o in q['options']])
+        return frag
+
+_fragment_cache = OrderedDict()
+_fragment_lock = threading.Lock()
+
+def _bank_fragments(bank):
+    key = (bank.path, bank.key[3])
+    with _fragment_lock:
+        frags = _fragment_cache.get(key)
+        if frags is None:
+            frags = _fragment_cache[key] = _BankFragments(bank)
+            while len(_fragment_cache) > COMPACT_CACHE_BANKS:
+                _fragment_cache.popitem(last=False)
+        else:
+            _fragment_cache.move_to_end(key)
+        return frags
+
+@timed_stage('json_encode')
+def encode_compact_exam(bank, exam):
+    frags = _bank_fragments(bank)
+    parts = []
+    for i, order in zip(exam.questions, exam.options):
+        head, options = frags.get(i)
+        parts.append(b'%s,[%s]]' % (head, b','.join([options[j] for j in order])))
+    return b'{"v":"%s","s":%d,"q":[%s]}' % (frags.version.encode('ascii'), exam.seed, b','.join(parts))
+
+def compress_for_request(data):
+    # (bayt, Content-Encoding) - Accept-Encoding-ə görə br > gzip > sıxılmamış
+    if len(data) < COMPRESS_MIN_SIZE:
+        return data, None
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    encoding = request.accept_encodings.best_match(offered)
+    if encoding == 'br':
+        return brotli.compress(data, quality=5), 'br'
+    if encoding == 'gzip':
+        return gzip.compress(data, 6, mtime=0), 'gzip'
+    return data, None
+
+def compact_response(data):
+    body, encoding = compress_for_request(data)
+    resp = make_response(body)
+    resp.mimetype = 'application/json'
+    resp.headers['Vary'] = 'Accept-Encoding'
+    if encoding:
+        resp.headers['Content-Encoding'] = encoding
+    return resp
+
+# --- LİDERLƏR LÖVHƏSİ ---
+# Top-K yaddaşda saxlanılır və record_score-da artımlı yenilənir. Ballar 0..EXAM_SIZE
+# aralığında olduğundan hər bal üçün say Fenwick ağacında tutulur: istifadəçinin yeri
+# O(log n)-də tapılır. Digər worker-lərin yazıları üçün baza hər LEADERBOARD_REFRESH
+# saniyədən bir PRAGMA data_version ilə yoxlanılır və dəyişibsə yenidən yüklənir.
+class Leaderboard:
+    def __init__(self, size=LEADERBOARD_SIZE, max_score=EXAM_SIZE):
+        self.size = size
+        self.max_score = max_score
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._checked_at = 0.0
+        self._data_version = None
+        self._top = []
+        self._tree = [0] * (max_score + 2)
+        self._total = 0
+        self.etag = None
+
+    def _clamp(self, score):
+        return min(max(int(score or 0), 0), self.max_score)
+
+    def _tree_add(self, score, delta):
+        i = self._clamp(score) + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _count_upto(self, score):
+        i, n = self._clamp(score) + 1, 0
+        while i > 0:
+            n += self._tree[i]
+            i -= i & -i
+        return n
+
+    def _changed(self):
+        self.etag = hashlib.sha1(json.dumps(self._top).encode('utf-8')).hexdigest()[:16]
+
+    def _reload(self):
+        c = self._conn
+        self._top = [[u, s] for u, s in c.execute("SELECT username, score FROM users ORDER BY score DESC LIMIT ?", (self.size,))]
+        self._tree = [0] * (self.max_score + 2)
+        self._total = 0
+        for score, n in c.execute("SELECT score, COUNT(*) FROM users GROUP BY score"):
+            self._tree_add(score, n)
+            self._total += n
+        # Növbədə gözləyən ballar hələ bazada yoxdur
+        for username, base_score, score in pending_scores():
+            self._update(username, base_score, score)
+        self._changed()
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._conn is not None and self._pid == os.getpid() and now - self._checked_at < LEADERBOARD_REFRESH:
+            return
+        if self._pid != os.getpid():
+            # fork-dan sonra valideynin bağlantısından istifadə etmirik
+            self._conn = connect_db(check_same_thread=False)
+            self._pid = os.getpid()
+            self._data_version = None
+        self._checked_at = now
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._reload()
+            self._data_version = version
+
+    def top(self):
+        with self._lock:
+            self._refresh()
+            return [{'username': u, 'score': s} for u, s in self._top], self.etag
+
+    def rank(self, score):
+        # (yer, ümumi say): yer = özündən yüksək bal toplayanların sayı + 1
+        with self._lock:
+            self._refresh()
+            return self._total - self._count_upto(score) + 1, self._total
+
+    def add_user(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                self._tree_add(0, 1)
+                self._total += 1
+
+    def _update(self, username, old_score, new_score):
+        self._tree_add(old_score, -1)
+        self._tree_add(new_score, 1)
+        top = [row for row in self._top if row[0] != username]
+        # Bərabər ballılar arasında yeni gələn sona düşür
+        pos = bisect.bisect_right([-s for _, s in top], -new_score)
+        top.insert(pos, [username, new_score])
+        self._top = top[:self.size]
+
+    def update(self, username, old_score, new_score):
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            self._update(username, old_score, new_score)
+            self._changed()
+
+    def invalidate(self):
+        with self._lock:
+            self._checked_at = 0.0
+            self._data_version = None
+
+leaderboard = Leaderboard()
+
+# --- TOPLU QEYDİYYAT (ROSTER) ---
+# CSV axınla oxunur (birinci sütun - ad), hissə-hissə müvəqqəti cədvələ yazılır və
+# hər hissə bir tranzaksiyada users-ə köçürülür. Tutulmuş adlar sətir-sətir sorğu
+# etmədən, bir JOIN ilə tapılır. Hər yeni istifadəçi üçün /login/<machine_id> linki qaytarılır.
+ROSTER_CHUNK_SIZE = 1000
+_ROSTER_HEADERS = {'username', 'name', 'ad', 'ad soyad'}
+
+def _bulk_machine_ids(n):
+    raw = os.urandom(16 * n)
+    return [str(uuid.UUID(bytes=raw[i:i + 16], version=4)) for i in range(0, 16 * n, 16)]
+
+def _import_roster_chunk(conn, names):
+    ids = _bulk_machine_ids(len(names))
+    with conn:
+        conn.execute("DELETE FROM temp.roster_import")
+        conn.executemany("INSERT INTO temp.roster_import (username, machine_id) VALUES (?, ?)", zip(names, ids))
+        conn.execute('''INSERT INTO users (machine_id, username, score)
+                        SELECT r.machine_id, r.username, 0 FROM temp.roster_import r
+                        WHERE NOT EXISTS (SELECT 1 FROM users u WHERE u.username = r.username)''')
+        rows = conn.execute('''SELECT r.username, r.machine_id, u.machine_id = r.machine_id
+                               FROM temp.roster_import r JOIN users u ON u.username = r.username''').fetchall()
+    created = [(name, machine_id) for name, machine_id, is_new in rows if is_new]
+    conflicts = [name for name, _, is_new in rows if not is_new]
+    return created, conflicts
+
+def import_roster(stream, chunk_size=ROSTER_CHUNK_SIZE):
+    # Generator: hər hissə üçün (yaradılanlar, tutulmuş adlar) qaytarır
+    conn = get_db()
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS roster_import (username TEXT, machine_id TEXT)")
+    seen = set()
+    chunk = []
+    for lineno, row in enumerate(csv.reader(stream)):
+        name = row[0].strip() if row else ''
+        if not name or (lineno == 0 and name.lower() in _ROSTER_HEADERS):
+            continue
+        if name in seen:
+            # CSV daxilində təkrar ad
+            yield [], [name]
+            continue
+        seen.add(name)
+        chunk.append(name)
+        if len(chunk) >= chunk_size:
+            yield _import_roster_chunk(conn, chunk)
+            chunk = []
+    if chunk:
+        yield _import_roster_chunk(conn, chunk)
+    leaderboard.invalidate()
+
+def login_url(base_url, machine_id):
+    return f"{base_url.rstrip('/')}/login/{machine_id}"
+
+@app.cli.command('import-roster')
+@click.argument('roster', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--output', '-o', type=click.File('w', encoding='utf-8'), default='-', help='Giriş linkləri üçün CSV.')
+@click.option('--base-url', default='http://localhost:5000', help='Linklərdəki serverin ünvanı.')
+def import_roster_command(roster, output, base_url):
+    """CSV-dəki adları toplu şəkildə qeydiyyatdan keçirir və giriş linklərini yazır."""
+    writer = csv.writer(output)
+    writer.writerow(['username', 'login_url'])
+    created = 0
+    conflicts = []
+    for new_users, taken in import_roster(roster):
+        writer.writerows((name, login_url(base_url, machine_id)) for name, machine_id in new_users)
+        created += len(new_users)
+        conflicts.extend(taken)
+    click.echo(f"{created} istifadəçi yaradıldı, {len(conflicts)} ad artıq tutulub.", err=True)
+    for name in conflicts:
+        click.echo(f"  tutulub: {name}", err=True)
+
+# --- NƏTİCƏLƏRİN İXRACI ---
+# Cəhdlər ayrıca bağlantının kursorundan fetchmany ilə hissə-hissə oxunur və generator vasitəsilə
+# birbaşa cavaba (və ya fayla) yazılır - yaddaş sətirlərin sayından asılı deyil. Sorğu
+# idx_attempts_created indeksi ilə vaxt sırasında gedir, çeşidləmə üçün müvəqqəti cədvəl yaranmır.
+# XLSX zipfile ilə axında (data descriptor-larla) qurulur; sətirlər inline string-dir.
+EXPORT_COLUMNS = ('username', 'created_at_utc', 'score', 'duration_s', 'seed')
+_XML_ILLEGAL_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_XLSX_PARTS = (
+    ('[Content_Types].xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+     '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+     '<Default Extension="xml" ContentType="application/xml"/>'
+     '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+     '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+     '</Types>'),
+    ('_rels/.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+     '</Relationships>'),
+    ('xl/workbook.xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+     'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+     '<sheets><sheet name="Nəticələr" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+    ('xl/_rels/workbook.xml.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+     '</Relationships>'),
+)
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+def _parse_export_time(value, end=False):
+    # "2024-05-01" və ya tam ISO vaxt (UTC); bitiş yalnız tarixdirsə həmin gün daxildir
+    if not value:
+        return None
+    parsed = datetime.datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        parsed += datetime.timedelta(days=1)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+def parse_export_filters(date_from=None, date_to=None, min_score=None, max_score=None):
+    return (_parse_export_time(date_from), _parse_export_time(date_to, end=True),
+            None if min_score in (None, '') else int(min_score),
+            None if max_score in (None, '') else int(max_score))
+
+_EXPORT_FILTERS = ('a.created_at >= ?', 'a.created_at < ?', 'a.score >= ?', 'a.score <= ?')
+
+def export_rows(filters, chunk_size=EXPORT_CHUNK_ROWS):
+    # Yalnız verilmiş filtrlər sorğuya düşür - vaxt aralığı indeksdə diapazon kimi axtarılır
+    where = [cond for cond, value in zip(_EXPORT_FILTERS, filters) if value is not None]
+    params = [value for value in filters if value is not None]
+    write_behind.flush()
+    # Axın sorğudan sonra da davam edir - thread-in ümumi bağlantısında uzun oxuma tranzaksiyası saxlamırıq
+    conn = connect_db()
+    try:
+        cursor = conn.execute('''SELECT u.username, a.created_at, a.score, a.duration, a.seed
+                                 FROM attempts a INDEXED BY idx_attempts_created JOIN users u ON u.machine_id = a.machine_id'''
+                              + (' WHERE ' + ' AND '.join(where) if where else '') + ' ORDER BY a.created_at', params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows: break
+            yield [(username, time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(created_at)), score,
+                    None if duration is None else round(duration, 1), seed)
+                   for username, created_at, score, duration, seed in rows]
+    finally:
+        conn.close()
+
+def _csv_cell(value):
+    # Excel düstur kimi icra etməsin (CSV injection)
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@'):
+        return "'" + value
+    return value
+
+def _csv_chunks(chunks):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in chunks:
+        writer.writerows([_csv_cell(v) for v in row] for row in rows)
+        yield buf.getvalue().encode('utf-8')
+        buf.seek(0)
+        buf.truncate()
+    yield buf.getvalue().encode('utf-8')
+
+class _ChunkSink(io.RawIOBase):
+    # zipfile-ın yazdığı baytları toplayır; axtarış (seek) dəstəklənmir - zipfile bunu özü nəzərə alır
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _xlsx_cell(ref, value):
+    if value is None:
+        return ''
+    if isinstance(value, (int, float)):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+    return f'<c r="{ref}" t="inlineStr"><is><t>{xml_escape(_XML_ILLEGAL_RE.sub("", str(value)))}</t></is></c>'
+
+def _xlsx_row(n, values):
+    return f'<row r="{n}">' + ''.join(_xlsx_cell(f'{col}{n}', v) for col, v in zip('ABCDE', values)) + '</row>'
+
+def _xlsx_chunks(chunks):
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, xml in _XLSX_PARTS:
+            zf.writestr(name, xml)
+        with zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                         '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                         + _xlsx_row(1, EXPORT_COLUMNS)).encode('utf-8'))
+            n = 1
+            for rows in chunks:
+                parts = []
+                for row in rows:
+                    n += 1
+                    parts.append(_xlsx_row(n, row))
+                sheet.write(''.join(parts).encode('utf-8'))
+                yield sink.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield sink.drain()
+
+def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 - gzip başlığı ilə
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_results(filters, fmt='csv', compress=False):
+    chunks = export_rows(filters)
+    if fmt == 'xlsx':
+        # XLSX artıq zip-dir, yenidən sıxılmır
+        return _xlsx_chunks(chunks)
+    data = _csv_chunks(chunks)
+    return _gzip_chunks(data) if compress else data
+
+@app.cli.command('export-results')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'xlsx']), default='csv', show_default=True)
+@click.option('--from', 'date_from', help='Başlanğıc tarix (YYYY-MM-DD, UTC).')
+@click.option('--to', 'date_to', help='Son tarix (daxil olmaqla).')
+@click.option('--min-score', type=int)
+@click.option('--max-score', type=int)
+@click.option('--gzip', 'compress', is_flag=True, help='CSV-ni gzip ilə sıxır.')
+@click.option('--output', '-o', type=click.File('wb'), default='-', help='Nəticə faylı.')
+def export_results_command(fmt, date_from, date_to, min_score, max_score, compress, output):
+    """Cəhdləri (filtrlərlə) CSV və ya XLSX kimi axınla ixrac edir."""
+    try:
+        filters = parse_export_filters(date_from, date_to, min_score, max_score)
+    except ValueError:
+        raise click.ClickException("Yanlış tarix formatı (YYYY-MM-DD gözlənilir).")
+    for chunk in export_results(filters, fmt, compress):
+        output.write(chunk)
+
 # --- HTML ---
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -79,19 +1882,12 @@ HTML_TEMPLATE = """
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Mülki Müdafiə - İmtahan</title>
-    <script src="https://cdn.tailwindcss.com"></script>
-    <link href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css" rel="stylesheet">
-    <style>
-        body { font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; background-color: #f3f4f6; user-select: none; }
-        .option-input:checked + .option-label { background-color: #e0f2fe; border-color: #3b82f6; color: #1e40af; }
-        .map-btn.current { border: 2px solid #f59e0b; }
-        ::-webkit-scrollbar { width: 8px; }
-        ::-webkit-scrollbar-thumb { background: #888; border-radius: 4px; }
-    </style>
+    {% for href, version in stylesheets %}<link href="/static/{{ href }}?v={{ version }}" rel="stylesheet">
+    {% endfor %}
 </head>
 <body class="flex flex-col h-screen overflow-hidden">
 
-    <div id="loginModal" class="fixed inset-0 bg-black bg-opacity-90 z-50 flex items-center justify-center {{ 'hidden' if user_exists else '' }}">
+    <div id="loginModal" class="fixed inset-0 bg-black/90 z-50 flex items-center justify-center hidden">
         <div class="bg-white p-8 rounded-xl shadow-2xl max-w-md w-full text-center">
             <i class="fas fa-user-shield text-5xl text-blue-900 mb-4"></i>
             <h2 class="text-2xl font-bold text-gray-800 mb-2">Xoş Gəlmisiniz!</h2>
@@ -111,7 +1907,7 @@ HTML_TEMPLATE = """
                 <i class="fas fa-shield-alt text-2xl"></i>
                 <div class="leading-tight">
                     <h1 class="text-xl font-bold">Mülki Müdafiə</h1>
-                    <div class="text-xs text-blue-200" id="headerUsername">{{ username if username else 'Qonaq' }}</div>
+                    <div class="text-xs text-blue-200" id="headerUsername">Qonaq</div>
                 </div>
             </div>
             <div class="flex items-center space-x-4">
@@ -123,7 +1919,7 @@ HTML_TEMPLATE = """
         </div>
     </header>
 
-    <div id="errorModal" class="fixed inset-0 bg-black bg-opacity-75 z-50 flex items-center justify-center hidden">
+    <div id="errorModal" class="fixed inset-0 bg-black/75 z-50 flex items-center justify-center hidden">
         <div class="bg-white p-8 rounded-lg text-center max-w-md">
             <i class="fas fa-exclamation-triangle text-4xl text-red-500 mb-4"></i>
             <h2 class="text-xl font-bold mb-2">Xəta</h2>
@@ -183,6 +1979,7 @@ HTML_TEMPLATE = """
 
                 <div class="bg-white rounded-xl shadow-lg p-8 border-t-4 border-yellow-500">
                     <h3 class="text-2xl font-bold text-gray-800 mb-4 flex items-center"><i class="fas fa-trophy text-yellow-500 mr-2"></i> Liderlər Lövhəsi (Top 10)</h3>
+                    <p id="myRank" class="text-sm text-gray-600 mb-4 hidden"></p>
                     <div class="overflow-x-auto">
                         <table class="w-full text-left">
                             <thead class="bg-gray-100 text-gray-600 uppercase text-xs">
@@ -201,12 +1998,17 @@ HTML_TEMPLATE = """
         </main>
     </div>
 
-    <div id="mobileMapModal" class="fixed inset-0 bg-black bg-opacity-50 z-40 hidden md:hidden" onclick="toggleMobileMap()">
+    <div id="mobileMapModal" class="fixed inset-0 bg-black/50 z-40 hidden md:hidden" onclick="toggleMobileMap()">
         <div class="absolute bottom-0 left-0 right-0 bg-white rounded-t-xl p-4 max-h-[70vh] overflow-y-auto" onclick="event.stopPropagation()"><div class="grid grid-cols-5 gap-3" id="mobileQuestionMap"></div></div>
     </div>
 
     <script>
         let questions = [];
+        let examSeed = null;
+        let examBank = null;
+        let examStrata = null;
+        let pendingAnswers = {};
+        let autosaveTimer = null;
         let userAnswers = {};
         let currentQuestionIndex = 0;
         let startTime;
@@ -249,7 +2051,16 @@ HTML_TEMPLATE = """
             if(!document.getElementById('loginModal').classList.contains('hidden')) return;
 
             try {
-                const response = await fetch('/api/questions');
+                // Davam edən imtahan varsa eyni vərəq, cavablar və keçən vaxt bərpa olunur
+                const session = await (await fetch('/api/session')).json();
+                if(session.error) throw new Error(session.error);
+                const params = new URLSearchParams({format: 'compact', seed: session.seed});
+                if(session.bank) params.set('bank', session.bank);
+                if(session.strata) params.set('strata', session.strata);
+                examBank = session.bank;
+                examStrata = session.strata;
+
+                const response = await fetch(`/api/questions?${params}`);
                 const data = await response.json();
                 
                 if(data.error) {
@@ -258,14 +2069,16 @@ HTML_TEMPLATE = """
                     throw new Error(data.error);
                 }
                 
-                questions = data;
+                examSeed = data.s;
+                questions = data.q.map(([id, text, options]) => ({id: id, original_id: id, text: text, options: options.map(t => ({text: t}))}));
                 userAnswers = new Array(questions.length).fill(null);
+                for (const [i, opt] of Object.entries(session.answers)) if (+i < questions.length) userAnswers[+i] = opt;
                 document.getElementById('loadingIndicator').classList.add('hidden');
                 document.getElementById('quizContent').classList.remove('hidden');
                 document.getElementById('totalQNum').innerText = questions.length;
                 renderMap();
                 renderQuestion(0);
-                startTimer();
+                startTimer(session.elapsed);
             } catch (error) {
                 document.getElementById('loadingIndicator').classList.add('hidden');
                 document.getElementById('errorModal').classList.remove('hidden');
@@ -291,15 +2104,13 @@ HTML_TEMPLATE = """
                 tr.innerHTML = `<td class="px-4 py-3 font-bold text-blue-900">${rankIcon}</td><td class="px-4 py-3 font-medium text-gray-700">${user.username}</td><td class="px-4 py-3 text-right font-bold text-gray-800">${user.score}</td>`;
                 tbody.appendChild(tr);
             });
-        }
 
-        async function submitScore(score) {
-            await fetch('/api/submit_score', {
-                method: 'POST',
-                headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({score: score})
-            });
-            loadLeaderboard();
+            const me = await (await fetch('/api/leaderboard/me')).json();
+            if(!me.error) {
+                const myRank = document.getElementById('myRank');
+                myRank.innerText = `Sizin yeriniz: #${me.rank} / ${me.total} (ən yüksək bal: ${me.score})`;
+                myRank.classList.remove('hidden');
+            }
         }
 
         function renderQuestion(index) {
@@ -337,55 +2148,275 @@ HTML_TEMPLATE = """
             updateMapHighlights();
         }
 
-        function selectOption(qIndex, optIndex) { userAnswers[qIndex] = optIndex; updateMapHighlights(); }
+        function selectOption(qIndex, optIndex) { userAnswers[qIndex] = optIndex; pendingAnswers[qIndex] = optIndex; scheduleAutosave(); updateMapHighlights(); }
+        function scheduleAutosave() { if (!autosaveTimer) autosaveTimer = setTimeout(autosave, 2000); }
+        async function autosave() {
+            // Yalnız son göndərişdən bəri dəyişən cavablar göndərilir
+            autosaveTimer = null;
+            const delta = pendingAnswers;
+            if (!Object.keys(delta).length) return;
+            pendingAnswers = {};
+            try {
+                const res = await fetch('/api/session/answers', {method: 'POST', headers: {'Content-Type': 'application/json'}, body: JSON.stringify({a: delta})});
+                if (!res.ok) throw new Error(res.status);
+            } catch (e) {
+                pendingAnswers = Object.assign(delta, pendingAnswers);
+                scheduleAutosave();
+            }
+        }
         function changeQuestion(delta) { const newIndex = currentQuestionIndex + delta; if (newIndex >= 0 && newIndex < questions.length) renderQuestion(newIndex); }
         function renderMap() { document.getElementById('questionMap').innerHTML = questions.map((_, i) => `<button id="mapBtn_${i}" onclick="renderQuestion(${i})" class="map-btn w-full aspect-square flex items-center justify-center border rounded text-sm font-medium hover:bg-gray-100 transition">${i + 1}</button>`).join(''); document.getElementById('mobileQuestionMap').innerHTML = document.getElementById('questionMap').innerHTML; }
         function updateMapHighlights() { questions.forEach((_, i) => { const btn = document.getElementById(`mapBtn_${i}`); const mobBtn = document.getElementById(`mobileQuestionMap`).children[i]; let cls = "map-btn w-full aspect-square flex items-center justify-center border rounded text-sm font-medium transition "; if (i === currentQuestionIndex) cls += "border-yellow-500 ring-2 ring-yellow-200 z-10 "; else cls += "border-gray-200 "; if (userAnswers[i] !== null) cls += "bg-blue-600 text-white border-blue-600 hover:bg-blue-700"; else cls += "bg-white text-gray-700 hover:bg-gray-50"; btn.className = cls; if(mobBtn) mobBtn.className = cls; }); }
-        function startTimer() { startTime = Date.now(); timerInterval = setInterval(() => { const diff = Math.floor((Date.now() - startTime) / 1000); document.getElementById('timer').innerText = `${Math.floor(diff / 60).toString().padStart(2, '0')}:${(diff % 60).toString().padStart(2, '0')}`; }, 1000); }
+        function startTimer(elapsed = 0) { startTime = Date.now() - elapsed * 1000; timerInterval = setInterval(() => { const diff = Math.floor((Date.now() - startTime) / 1000); document.getElementById('timer').innerText = `${Math.floor(diff / 60).toString().padStart(2, '0')}:${(diff % 60).toString().padStart(2, '0')}`; }, 1000); }
         
-        function finishQuiz() {
+        async function finishQuiz() {
             if(!confirm("İmtahanı tamamlamaq istədiyinizə əminsiniz?")) return;
             clearInterval(timerInterval);
-            let correct = 0, wrong = 0, empty = 0;
+            let grade;
+            try {
+                const res = await fetch('/api/grade', {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify({seed: examSeed, bank: examBank, strata: examStrata, answers: userAnswers})
+                });
+                grade = await res.json();
+                if(grade.error) throw new Error(grade.error);
+            } catch (error) {
+                document.getElementById('errorModal').classList.remove('hidden');
+                document.getElementById('errorMessage').innerText = error.message;
+                return;
+            }
             const reviewContainer = document.getElementById('reviewContainer');
             reviewContainer.innerHTML = '';
             questions.forEach((q, i) => {
                 const userAnsIdx = userAnswers[i];
-                const correctOpt = q.options.find(o => o.isCorrect);
-                let status = 'empty';
-                if(userAnsIdx !== null) { if(q.options[userAnsIdx].isCorrect) { correct++; status = 'correct'; } else { wrong++; status = 'wrong'; } } else { empty++; }
+                const {status, correct: correctIdx} = grade.results[i];
+                const correctOpt = q.options[correctIdx];
                 
                 const card = document.createElement('div');
                 card.className = `p-4 border rounded-lg ${status === 'correct' ? 'bg-green-50 border-green-200' : status === 'wrong' ? 'bg-red-50 border-red-200' : 'bg-gray-50'}`;
                 card.innerHTML = `<div class="flex gap-3"><div class="flex flex-col items-center justify-start min-w-[3rem]"><span class="font-bold text-gray-600 text-xl">${i+1}.</span><span class="text-[10px] text-gray-500 bg-gray-200 px-1.5 rounded mt-1 font-mono">ID:${q.original_id}</span></div><div class="flex-1"><p class="font-medium mb-2">${q.text}</p><div class="text-sm space-y-1">${status !== 'empty' ? `<div class="${status === 'correct' ? 'text-green-700 font-bold' : 'text-red-700 font-bold'}">Sizin cavab: ${q.options[userAnsIdx].text}</div>` : `<div class="text-gray-500 italic">Cavab verilməyib</div>`}<div class="text-green-700 bg-green-100 inline-block px-2 py-1 rounded text-xs font-bold mt-1">Doğru: ${correctOpt ? correctOpt.text : 'Təyin olunmayıb'}</div></div></div><div class="text-xl">${status === 'correct' ? '<i class="fas fa-check text-green-500"></i>' : status === 'wrong' ? '<i class="fas fa-times text-red-500"></i>' : '<i class="fas fa-minus text-gray-400"></i>'}</div></div>`;
                 reviewContainer.appendChild(card);
             });
-            document.getElementById('finalScore').innerText = correct; document.getElementById('correctCount').innerText = correct; document.getElementById('wrongCount').innerText = wrong; document.getElementById('emptyCount').innerText = empty;
-            submitScore(correct);
+            document.getElementById('finalScore').innerText = grade.score; document.getElementById('correctCount').innerText = grade.correct; document.getElementById('wrongCount').innerText = grade.wrong; document.getElementById('emptyCount').innerText = grade.empty;
+            loadLeaderboard();
             document.getElementById('quizContent').classList.add('hidden'); document.getElementById('resultsScreen').classList.remove('hidden'); document.querySelector('aside').classList.add('hidden');
         }
         
         function toggleMobileMap() { document.getElementById('mobileMapModal').classList.toggle('hidden'); }
-        window.onload = loadQuestions;
+        async function bootstrap() {
+            // Səhifə statikdir - istifadəçi məlumatı kiçik bir JSON-dan gəlir
+            const me = await (await fetch('/api/me')).json();
+            if(!me.user_exists) {
+                document.getElementById('loginModal').classList.remove('hidden');
+                return;
+            }
+            document.getElementById('headerUsername').innerText = me.username;
+            loadQuestions();
+        }
+        window.onload = bootstrap;
     </script>
 </body>
 </html>
 """
 
+# --- STATİK FAYLLAR ---
+# Səhifə (shell) və statik fayllar bir dəfə oxunur, gzip/brotli variantları əvvəlcədən
+# hazırlanır və Accept-Encoding-ə görə seçilir. Fayl dəyişəndə (mtime) yenidən yüklənir.
+class EncodedAsset:
+    def __init__(self, data, mimetype):
+        self.mimetype = mimetype
+        self.etag = hashlib.sha1(data).hexdigest()[:16]
+        self.variants = {'identity': data, 'gzip': gzip.compress(data, 9)}
+        if brotli is not None:
+            self.variants['br'] = brotli.compress(data)
+
+    def response(self, cache_control):
+        encoding = request.accept_encodings.best_match([e for e in ('br', 'gzip') if e in self.variants], 'identity')
+        resp = make_response(self.variants[encoding])
+        resp.mimetype = self.mimetype
+        if encoding != 'identity':
+            resp.headers['Content-Encoding'] = encoding
+        resp.headers['Vary'] = 'Accept-Encoding'
+        resp.headers['Cache-Control'] = cache_control
+        resp.set_etag(f"{self.etag}-{encoding}")
+        return resp.make_conditional(request)
+
+_static_cache = {}
+
+def static_asset(filename):
+    path = safe_join(STATIC_DIR, filename)
+    if path is None or not os.path.isfile(path):
+        return None
+    mtime = os.stat(path).st_mtime_ns
+    cached = _static_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, 'rb') as f:
+            data = f.read()
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        cached = _static_cache[path] = (mtime, EncodedAsset(data, mimetype))
+    return cached[1]
+
+# Font Awesome CDN-dən deyil, static/vendor-dan verilir - imtahan şəbəkəsində internet olmaya bilər
+SHELL_STYLESHEETS = ('app.css', 'vendor/fontawesome/css/fontawesome.min.css',
+                     'vendor/fontawesome/css/solid.min.css', 'vendor/fontawesome/css/regular.min.css')
+_shell = None
+
+def exam_shell():
+    # Şablon yalnız bir dəfə (CSS versiyaları dəyişəndə yenidən) render olunur
+    global _shell
+    stylesheets = []
+    for href in SHELL_STYLESHEETS:
+        asset = static_asset(href)
+        stylesheets.append((href, asset.etag if asset else ''))
+    stylesheets = tuple(stylesheets)
+    if _shell is None or _shell[0] != stylesheets:
+        html = app.jinja_env.from_string(HTML_TEMPLATE).render(stylesheets=stylesheets)
+        _shell = (stylesheets, EncodedAsset(html.encode('utf-8'), 'text/html'))
+    return _shell[1]
+
+# Tailwind v4 çıxışı Chrome 111 / Firefox 128 / Safari 16.4 üçündür: @layer dəstəklənməyən brauzer
+# bütün qaydaları, oklch() dəstəklənməyən isə bütün rəngləri atır. Laboratoriya kompüterlərindəki
+# köhnə brauzerlər üçün build-css nəticəni sadələşdirir: @layer blokları açılır, oklch() hex-ə
+# çevrilir, :where()/:is() (peer-checked və vergüllü siyahılar daxil) adi selektorlara, inset isə top/right/bottom/left-ə
+# açılır, padding-inline/margin-block kimi məntiqi xassələr fiziki (left/right/top/bottom) xassələrə
+# çevrilir, @property olmayanlar üçün --tw-* başlanğıc dəyərləri hər yerdə tətbiq olunur.
+# color-mix() artıq @supports içindədir və hex ehtiyat dəyəri var. Nəticədə minimum:
+# Chrome/Edge 84, Firefox 78 ESR, Safari 14.1 (flex gap). Yeganə fərq: aspect-ratio (Chrome 88) olmadığı
+# üçün sual xəritəsinin düymələri köhnə brauzerlərdə kvadrat deyil, məzmun hündürlüyündə olur.
+_OKLCH_RE = re.compile(r'oklch\(([\d.]+)%\s+([\d.]+)\s+([\d.]+)(?:\s*/\s*([\d.]+)(%?))?\)')
+_PEER_RE = re.compile(r'(\.(?:\\.|[\w-])+):is\(:where\(\.peer\):checked~\*\)')
+_WHERE_RE = re.compile(r':where\(((?:[^(),]|\([^()]*\))*)\)')
+# Vergüllü siyahı: input:where([type=button],[type=submit]) -> input[type=button],input[type=submit]
+_SELECTOR_LIST_RE = re.compile(r':(?:is|where)\(((?:[^()]|\([^()]*\))*,(?:[^()]|\([^()]*\))*)\)')
+_RULE_RE = re.compile(r'(?:(?<=[{}])|^)([^{}@;]+)\{')
+_INSET_RE = re.compile(r'(?<![\w-])inset:([^;}\s]+)(?=[;}])')
+# padding-inline/margin-block (Chrome 87) -> fiziki xassələr; səhifə soldan sağa yazılır
+_LOGICAL_RE = re.compile(r'(?<![\w-])(margin|padding)-(inline|block)(?:-(start|end))?:([^;}]+)(?=[;}])')
+_LOGICAL_SIDES = {'inline': ('left', 'right'), 'block': ('top', 'bottom')}
+
+def _logical_to_physical(match):
+    prop, axis, edge, value = match.groups()
+    sides = _LOGICAL_SIDES[axis]
+    if edge:
+        sides = sides[:1] if edge == 'start' else sides[1:]
+    return ';'.join(f'{prop}-{side}:{value}' for side in sides)
+
+def _oklch_to_hex(match):
+    lightness, chroma, hue = float(match.group(1)) / 100, float(match.group(2)), math.radians(float(match.group(3)))
+    a, b = chroma * math.cos(hue), chroma * math.sin(hue)
+    l = (lightness + 0.3963377774 * a + 0.2158037573 * b) ** 3
+    m = (lightness - 0.1055613458 * a - 0.0638541728 * b) ** 3
+    s = (lightness - 0.0894841775 * a - 1.2914855480 * b) ** 3
+    rgb = (4.0767416621 * l - 3.3077115913 * m + 0.2309699292 * s,
+           -1.2684380046 * l + 2.6097574011 * m - 0.3413193965 * s,
+           -0.0041960863 * l - 0.7034186147 * m + 1.7076147010 * s)
+    channels = []
+    for x in rgb:
+        x = 12.92 * x if x <= 0.0031308 else 1.055 * max(x, 0) ** (1 / 2.4) - 0.055
+        channels.append(round(min(max(x, 0.0), 1.0) * 255))
+    if match.group(4) is not None:
+        alpha = float(match.group(4)) / (100 if match.group(5) else 1)
+        channels.append(round(min(max(alpha, 0.0), 1.0) * 255))
+    return '#' + ''.join(f'{c:02x}' for c in channels)
+
+def _unwrap_blocks(css, prelude):
+    # "prelude{...}" blokunu məzmunu ilə əvəz edir, "@layer a,b;" kimi ifadələri silir
+    out, i = [], 0
+    while True:
+        j = css.find(prelude, i)
+        if j < 0:
+            out.append(css[i:])
+            return ''.join(out)
+        out.append(css[i:j])
+        k = j + len(prelude)
+        while css[k] not in '{;':
+            k += 1
+        if css[k] == ';':
+            i = k + 1
+            continue
+        depth, end = 1, k + 1
+        while depth:
+            if css[end] == '{': depth += 1
+            elif css[end] == '}': depth -= 1
+            end += 1
+        out.append(_unwrap_blocks(css[k + 1:end - 1], prelude))
+        i = end
+
+def _split_selectors(text):
+    parts, depth, start = [], 0, 0
+    for i, c in enumerate(text):
+        if c in '([': depth += 1
+        elif c in ')]': depth -= 1
+        elif c == ',' and not depth:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return [part.strip() for part in parts]
+
+def _expand_selector(selector):
+    match = _SELECTOR_LIST_RE.search(selector)
+    if not match:
+        return [selector]
+    return [expanded for alternative in _split_selectors(match.group(1))
+            for expanded in _expand_selector(selector[:match.start()] + alternative + selector[match.end():])]
+
+def _expand_selector_lists(match):
+    if not _SELECTOR_LIST_RE.search(match.group(1)):
+        return match.group(0)
+    return ','.join(expanded for selector in _split_selectors(match.group(1)) for expanded in _expand_selector(selector)) + '{'
+
+def downlevel_css(css):
+    css = _unwrap_blocks(css, '@layer')
+    css = _unwrap_blocks(css, '@supports (((-webkit-hyphens:none))')
+    css = _OKLCH_RE.sub(_oklch_to_hex, css)
+    css = _PEER_RE.sub(r'.peer:checked~\1', css)
+    css = _RULE_RE.sub(_expand_selector_lists, css)
+    css = _WHERE_RE.sub(r'\1', css)
+    css = _LOGICAL_RE.sub(_logical_to_physical, css)
+    return _INSET_RE.sub(r'top:\1;right:\1;bottom:\1;left:\1', css)
+
+@app.cli.command('build-css')
+def build_css_command():
+    """static/src/app.css-dən Tailwind ilə minimallaşdırılmış static/app.css yaradır."""
+    output = os.path.join(STATIC_DIR, 'app.css')
+    try:
+        subprocess.run([TAILWIND_BIN, '-i', os.path.join(STATIC_DIR, 'src', 'app.css'), '-o', output, '--minify'], check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        raise click.ClickException(f"Tailwind işə düşmədi ({TAILWIND_BIN}): {e}")
+    with open(output, encoding='utf-8') as f:
+        css = downlevel_css(f.read())
+    with open(output, 'w', encoding='utf-8') as f:
+        f.write(css)
+    click.echo(f"'{output}' yaradıldı ({os.path.getsize(output)} bayt).")
+
 # --- ROUTES ---
 
 @app.route('/')
 def index():
+    # Hər istifadəçiyə eyni statik səhifə; ETag ilə təkrar yükləmə 304 qaytarır
+    return exam_shell().response('no-cache')
+
+@app.route('/static/<path:filename>')
+def static_file(filename):
+    asset = static_asset(filename)
+    if asset is None:
+        return jsonify({'error': 'Fayl tapılmadı.'}), 404
+    if request.args.get('v') == asset.etag:
+        # Versiyalı URL heç vaxt dəyişmir - brauzer bir il yenidən soruşmur
+        return asset.response('public, max-age=31536000, immutable')
+    return asset.response('no-cache')
+
+@app.route('/api/me')
+def get_me():
     machine_id = request.cookies.get('quiz_user_id')
     user_exists = False
     username = None
 
     if machine_id:
-        conn = sqlite3.connect(DB_FILENAME)
-        c = conn.cursor()
+        c = get_db().cursor()
         c.execute("SELECT username FROM users WHERE machine_id=?", (machine_id,))
         result = c.fetchone()
-        conn.close()
         
         # DÜZƏLİŞ: Əgər cookie var, amma baza boşdursa (user silinib),
         # 'user_exists = False' qoyuruq ki, yenidən qeydiyyat pəncərəsi açılsın.
@@ -396,14 +2427,57 @@ def index():
             # Cookie var, amma user yoxdur (Zombie Cookie).
             user_exists = False
 
-    return render_template_string(HTML_TEMPLATE, user_exists=user_exists, username=username)
+    resp = jsonify({'user_exists': user_exists, 'username': username})
+    resp.headers['Cache-Control'] = 'private, no-store'
+    return resp
+
+@app.route('/login/<machine_id>')
+def login_link(machine_id):
+    # Toplu qeydiyyatdan gələn link: cookie qeydiyyat sorğusu olmadan verilir
+    resp = redirect('/')
+    row = get_db().execute("SELECT 1 FROM users WHERE machine_id=?", (machine_id,)).fetchone()
+    if row:
+        resp.set_cookie('quiz_user_id', machine_id, max_age=60*60*24*365*10)
+    return resp
+
+@app.route('/api/admin/roster', methods=['POST'])
+@admin_required
+def import_roster_api():
+    upload = request.files.get('file')
+    raw = upload.stream if upload else request.stream
+    stream = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+    users, conflicts = [], []
+    for new_users, taken in import_roster(stream):
+        users.extend({'username': name, 'login_url': login_url(request.host_url, machine_id)} for name, machine_id in new_users)
+        conflicts.extend(taken)
+    return jsonify({'success': True, 'created': len(users), 'users': users, 'conflicts': conflicts})
+
+@app.route('/api/admin/export')
+@admin_required
+def export_results_api():
+    # ?format=csv|xlsx&from=&to=&min_score=&max_score=&gzip=1
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_MIMETYPES:
+        return jsonify({'error': "Format 'csv' və ya 'xlsx' olmalıdır."}), 400
+    try:
+        filters = parse_export_filters(request.args.get('from'), request.args.get('to'),
+                                       request.args.get('min_score'), request.args.get('max_score'))
+    except ValueError:
+        return jsonify({'error': "Yanlış tarix və ya bal filtri."}), 400
+    compress = fmt == 'csv' and request.args.get('gzip') == '1'
+    filename = f"results.{fmt}" + ('.gz' if compress else '')
+    resp = app.response_class(export_results(filters, fmt, compress),
+                              content_type='application/gzip' if compress else EXPORT_MIMETYPES[fmt])
+    resp.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    resp.headers['Cache-Control'] = 'no-store'
+    return resp
 
 @app.route('/api/register', methods=['POST'])
 def register():
     data = request.json
     username = data.get('username')
     
-    conn = sqlite3.connect(DB_FILENAME)
+    conn = get_db()
     c = conn.cursor()
     
     # DÜZƏLİŞ: İlk öncə ADIN tutulub-tutulmadığını yoxlayırıq
@@ -411,7 +2485,6 @@ def register():
     existing_user = c.fetchone()
     
     if existing_user:
-        conn.close()
         return jsonify({'success': False, 'error': 'Bu ad artıq istifadə olunur. Zəhmət olmasa başqa ad seçin.'})
 
     # DÜZƏLİŞ: Əgər köhnə cookie varsa da, onu yeniləyəcəyik (Loop probleminin həlli)
@@ -421,65 +2494,243 @@ def register():
     try:
         c.execute("INSERT INTO users (machine_id, username, score) VALUES (?, ?, 0)", (new_machine_id, username))
         conn.commit()
-        conn.close()
+        leaderboard.add_user()
         
         resp = make_response(jsonify({'success': True}))
         # Cookie yenilənir
         resp.set_cookie('quiz_user_id', new_machine_id, max_age=60*60*24*365*10)
         return resp
     except Exception as e:
-        conn.close()
+        conn.rollback()
         return jsonify({'success': False, 'error': str(e)})
 
+def record_score(machine_id, new_score, seed=None, duration=None):
+    # Oxuma WAL-da kilidsizdir; yazı isə növbəyə düşür və toplu şəkildə tətbiq olunur
+    c = get_db().cursor()
+    c.execute("SELECT username, score FROM users WHERE machine_id=?", (machine_id,))
+    current = c.fetchone()
+    if not current: return
+    # Bal yalnız yoxlanıldıqdan sonra cəhd kimi yazılır
+    if type(new_score) is not int or not 0 <= new_score <= EXAM_SIZE: return
+
+    record_attempt(machine_id, new_score, seed, duration)
+
+    username, db_score = current
+    with _pending_lock:
+        pending = _pending_scores.get(machine_id)
+        old_score = max(db_score, pending[2]) if pending else db_score
+        if new_score <= old_score: return
+        _pending_scores[machine_id] = [username, db_score, new_score]
+    leaderboard.update(username, old_score, new_score)
+    write_behind.submit('score', (machine_id, new_score))
+
 @app.route('/api/submit_score', methods=['POST'])
+@admin_required
 def save_score():
+    # Köhnə endpoint: namizədlər balı /api/grade ilə alır, bu yalnız admin üçün (məs. əl ilə düzəliş)
     machine_id = request.cookies.get('quiz_user_id')
     if not machine_id: return jsonify({'error': 'No user'})
-    
-    new_score = request.json.get('score', 0)
-    
-    conn = sqlite3.connect(DB_FILENAME)
-    c = conn.cursor()
-    c.execute("SELECT score FROM users WHERE machine_id=?", (machine_id,))
-    current = c.fetchone()
-    
-    if current and new_score > current[0]:
-        c.execute("UPDATE users SET score=? WHERE machine_id=?", (new_score, machine_id))
-        conn.commit()
-    conn.close()
+
+    data = request.json
+    new_score = data.get('score') if isinstance(data, dict) else None
+    if type(new_score) is not int or not 0 <= new_score <= EXAM_SIZE:
+        return jsonify({'error': "Yanlış bal."}), 400
+    record_score(machine_id, new_score)
     return jsonify({'success': True})
 
+@app.route('/api/grade', methods=['POST'])
+def grade_api():
+    machine_id = request.cookies.get('quiz_user_id')
+    if not machine_id: return jsonify({'error': 'No user'})
+
+    # Yalnız istifadəçinin açıq sessiyasındakı vərəq qiymətləndirilir - seed/strata müştəridən götürülmür
+    conn = get_db()
+    session = conn.execute("SELECT bank, seed, strata, started_at FROM exam_sessions WHERE machine_id = ? AND finished = 0",
+                           (machine_id,)).fetchone()
+    data = request.json
+    if not isinstance(data, dict):
+        return jsonify({'error': "Yanlış format."})
+    if session is None or ('seed' in data and data['seed'] != session[1]):
+        return jsonify({'error': "Aktiv imtahan tapılmadı və ya artıq qiymətləndirilib."})
+    bank_name, seed, strata_spec, started_at = session
+    bank = get_named_bank(bank_name)
+    if bank is None or not len(bank):
+        return jsonify({'error': "Sual bankı tapılmadı."})
+    try:
+        strata = parse_strata(strata_spec)
+    except ValueError:
+        return jsonify({'error': "Yanlış 'seed' və ya 'strata' parametri."})
+
+    exam = build_exam(bank, seed, strata=strata)
+    answers = data.get('answers')
+    if not isinstance(answers, list) or len(answers) != len(exam.questions):
+        return jsonify({'error': "Cavabların sayı vərəqdəki sualların sayı ilə uyğun gəlmir."})
+
+    graded = grade_many(bank, [exam], [answers])[0]
+    # Sessiyanın bağlanması və vərəqin yazılması bir tranzaksiyadadır: eyni seed ikinci dəfə
+    # qiymətləndirilmir və doğru cavablar yalnız nəticə qeydə alındıqdan sonra qaytarılır
+    with conn:
+        finished = conn.execute("UPDATE exam_sessions SET finished = 1 WHERE machine_id = ? AND seed = ? AND finished = 0",
+                                (machine_id, seed)).rowcount
+        if finished:
+            conn.execute("INSERT INTO submissions (machine_id, bank, seed, strata, answers, score) VALUES (?, ?, ?, ?, ?, ?)",
+                         (machine_id, bank_name, seed, strata_spec, json.dumps(answers, separators=(',', ':')), graded[0]))
+    if not finished:
+        return jsonify({'error': "Aktiv imtahan tapılmadı və ya artıq qiymətləndirilib."})
+    with _answers_lock:
+        _pending_answers.pop(machine_id, None)
+
+    result = grade_exam(bank, exam, answers, graded)
+    record_item_stats(bank_name, bank, exam, graded)
+    record_score(machine_id, result['score'], seed, max(0.0, time.time() - started_at))
+    return jsonify(result)
+
+@app.route('/api/admin/regrade', methods=['POST'])
+@admin_required
+def regrade_api():
+    changed = regrade_submissions(get_db())
+    return jsonify({'success': True, 'changed': changed})
+
+@app.route('/api/admin/items')
+@admin_required
+def item_analysis_api():
+    bank_name = request.args.get('bank')
+    bank = get_named_bank(bank_name)
+    if bank is None:
+        return jsonify({'error': "Sual bankı tapılmadı."}), 404
+    return jsonify({'bank': bank_name or '', 'items': item_analysis(get_db(), bank_name or '', bank)})
+
 @app.route('/api/leaderboard')
 def get_leaderboard():
-    conn = sqlite3.connect(DB_FILENAME)
-    c = conn.cursor()
-    c.execute("SELECT username, score FROM users ORDER BY score DESC LIMIT 10")
-    users = [{'username': row[0], 'score': row[1]} for row in c.fetchall()]
-    conn.close()
-    return jsonify(users)
+    users, etag = leaderboard.top()
+    resp = jsonify(users)
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp.make_conditional(request)
+
+@app.route('/api/leaderboard/me')
+def get_my_rank():
+    machine_id = request.cookies.get('quiz_user_id')
+    if not machine_id: return jsonify({'error': 'No user'})
+
+    row = get_db().execute("SELECT score FROM users WHERE machine_id=?", (machine_id,)).fetchone()
+    if not row: return jsonify({'error': 'No user'})
+
+    score = pending_score(machine_id, row[0])
+    rank, total = leaderboard.rank(score)
+    return jsonify({'rank': rank, 'total': total, 'score': score})
+
+@app.route('/api/history')
+def get_history_api():
+    # Günlük aqreqatlar (son 30 gün) və son cəhdlər; ən yüksək bal users.score-dan
+    machine_id = request.cookies.get('quiz_user_id')
+    if not machine_id: return jsonify({'error': 'No user'})
+
+    conn = get_db()
+    row = conn.execute("SELECT score FROM users WHERE machine_id=?", (machine_id,)).fetchone()
+    if not row: return jsonify({'error': 'No user'})
+
+    daily, recent = attempt_history(conn, machine_id)
+    return jsonify({'best': pending_score(machine_id, row[0]), 'daily': daily, 'recent': recent})
+
+@app.route('/api/session')
+def get_session_api():
+    # Davam edən imtahanı qaytarır (səhifə yenilənəndə eyni vərəq, cavablar və vaxt), yoxdursa yenisini açır
+    machine_id = request.cookies.get('quiz_user_id')
+    if not machine_id: return jsonify({'error': 'No user'})
+
+    session = load_session(machine_id)
+    if session is None:
+        strata_spec = request.args.get('strata', EXAM_STRATA)
+        session = start_session(machine_id, request.args.get('bank'), None if strata_spec is None else str(strata_spec))
+    resp = jsonify(session)
+    resp.headers['Cache-Control'] = 'private, no-store'
+    return resp
+
+@app.route('/api/session/answers', methods=['POST'])
+def save_answers_api():
+    machine_id = request.cookies.get('quiz_user_id')
+    if not machine_id: return jsonify({'error': 'No user'})
+
+    data = request.json
+    delta = data.get('a') if isinstance(data, dict) else None
+    if not isinstance(delta, dict):
+        return jsonify({'error': "Yanlış format."})
+    clean = {}
+    for key, value in delta.items():
+        # isdigit() '²' kimi simvolları da qəbul edir, int() isə onlarda xəta verir;
+        # uzunluq int()-dən əvvəl yoxlanılır - 4300 rəqəmdən uzun sətir ValueError atır
+        if not (key.isascii() and key.isdecimal() and len(key) <= 4) or int(key) >= EXAM_SIZE * 20 or not (value is None or (type(value) is int and 0 <= value < 100)):
+            return jsonify({'error': "Yanlış format."})
+        clean[str(int(key))] = value
+    save_answer_delta(machine_id, clean)
+    return jsonify({'success': True})
+
+@app.route('/metrics')
+def metrics_api():
+    resp = make_response(metrics.render())
+    resp.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return resp
+
+@app.route('/api/admin/profile')
+@admin_required
+def profile_api():
+    # QUIZ_PROFILE_ROUTE ilə seçilmiş route-un steki (flamegraph.pl / speedscope üçün); ?reset=1 sıfırlayır
+    resp = make_response(profiler.collapsed(reset=request.args.get('reset') == '1'))
+    resp.headers['Content-Type'] = 'text/plain; charset=utf-8'
+    return resp
+
+@app.route('/api/banks')
+def get_banks_api():
+    return jsonify(list_bank_names())
+
+@app.route('/api/search')
+def search_api():
+    bank_name = request.args.get('bank')
+    bank = get_named_bank(bank_name)
+    if bank is None:
+        return jsonify({'error': "Sual bankı tapılmadı."})
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = min(SEARCH_MAX_PAGE_SIZE, max(1, int(request.args.get('per_page', SEARCH_PAGE_SIZE))))
+        # OFFSET SQLite-ın 64 bitlik tam ədədinə sığmalıdır (əks halda OverflowError -> 500)
+        if (page - 1) * per_page >= 2 ** 31:
+            raise ValueError(page)
+    except ValueError:
+        return jsonify({'error': "Yanlış 'page' və ya 'per_page' parametri."})
+    results, has_more = search_bank(get_db(), bank_name or '', bank, request.args.get('q', ''), page, per_page)
+    return jsonify({'results': results, 'page': page, 'has_more': has_more})
 
 @app.route('/api/questions')
 def get_questions_api():
-    if not os.path.exists(PDF_FILENAME):
+    bank_name = request.args.get('bank')
+    bank = get_named_bank(bank_name)
+    if bank is None:
+        if bank_name:
+            return jsonify({'error': f"'{bank_name}' adlı sual bankı tapılmadı."})
         return jsonify({'error': f"'{PDF_FILENAME}' faylı tapılmadı."})
-    
-    text = extract_text_from_pdf(PDF_FILENAME)
-    if not text:
+
+    if not bank.readable:
         return jsonify({'error': "PDF-dən mətn oxuna bilmədi."})
 
-    all_questions = parse_quiz_content(text)
-    
-    if not all_questions:
-        debug_snippet = text[:500] if text else "Mətn boşdur"
-        return jsonify({'error': "Suallar tapılmadı.", 'debug': f"PDF-dən oxunan ilk hissə:\n{debug_snippet}..."})
-
-    count = min(len(all_questions), 50)
-    selected_questions = random.sample(all_questions, count)
-    for q in selected_questions:
-        q['original_id'] = q['id']
-        random.shuffle(q['options'])
-        
-    return jsonify(selected_questions)
+    if not len(bank):
+        return jsonify({'error': "Suallar tapılmadı.", 'debug': f"PDF-dən oxunan ilk hissə:\n{bank.debug_snippet}..."})
+
+    try:
+        strata = parse_strata(request.args.get('strata', EXAM_STRATA))
+        seed = int(request.args['seed']) if 'seed' in request.args else new_exam_seed()
+    except ValueError:
+        return jsonify({'error': "Yanlış 'seed' və ya 'strata' parametri."})
+
+    exam = build_exam(bank, seed, strata=strata)
+    if not exam.questions:
+        return jsonify({'error': "Seçilmiş bölmələrdə sual tapılmadı."})
+    if request.args.get('format') == 'compact':
+        resp = compact_response(encode_compact_exam(bank, exam))
+    else:
+        resp = jsonify(render_exam(bank, exam))
+    resp.headers['X-Exam-Seed'] = str(exam.seed)
+    return resp
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,121 @@
+"""parse_quiz_content üçün benchmark.
+
+Sintetik 10k və 100k suallıq mətnlərdə köhnə (sətir-sətir çoxlu skan) parser ilə
+yenisini müqayisə edir, nəticələrin eyni olduğunu yoxlayır və miqyaslanmanı göstərir.
+
+    python benchmarks/bench_parser.py [--sizes 10000 100000] [--repeat 3]
+"""
+import argparse
+import gc
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import parse_quiz_content  # noqa: E402
+
+
+def legacy_parse_quiz_content(text):
+    # user-004-dən əvvəlki versiya, müqayisə üçün olduğu kimi saxlanılıb
+    questions = []
+    lines = text.split('\n')
+    current_question = None
+    question_start_regex = re.compile(r'^\s*(\d+)\s*[\.\)\-]\s*(.*)')
+    correct_markers = ['✔', '√', '+', '✓']
+    bullet_markers = ['•', '●', '-', '*', ')']
+
+    for line in lines:
+        line = line.strip()
+        if not line or '--- PAGE' in line or 'Fənn:' in line: continue
+        q_match = question_start_regex.match(line)
+        if q_match:
+            if current_question and len(current_question['options']) > 0:
+                questions.append(current_question)
+            current_question = {'id': int(q_match.group(1)), 'text': q_match.group(2).strip(), 'options': []}
+        elif current_question:
+            is_correct = any(marker in line for marker in correct_markers)
+            is_option_line = is_correct or any(line.startswith(b) for b in bullet_markers)
+            if not current_question['options'] and not is_option_line:
+                current_question['text'] += " " + line
+            else:
+                is_continuation = not is_option_line and (len(line) > 0 and (line[0].islower() or line[0] in [',', ';', ':']))
+                if is_continuation and current_question['options']:
+                    current_question['options'][-1]['text'] += " " + line
+                else:
+                    option_text = line
+                    for marker in correct_markers: option_text = option_text.replace(marker, '')
+                    option_text = re.sub(r'^[\s•\-\*\)\.]+', '', option_text).strip()
+                    if option_text and not re.match(r'^\d+\.$', option_text):
+                        current_question['options'].append({'text': option_text, 'isCorrect': is_correct})
+    if current_question and len(current_question['options']) > 0:
+        questions.append(current_question)
+    return questions
+
+
+WORDS = ("müəssisə qərargah rəislərinə dəstə komandirlərinə mülki müdafiə xidməti "
+         "təhlükəli təzahürlərə fövqəladə hadisə yanğından mühafizə tibb rabitə").split()
+
+
+def synthetic_text(n_questions, seed=0):
+    rnd = random.Random(seed)
+    words = lambda k: " ".join(rnd.choice(WORDS) for _ in range(k))
+    lines = ["00034 Yekun imtahan testinin sualları  Fənn : 00034 Mülki müdafiə", ""]
+    for qid in range(1, n_questions + 1):
+        lines.append(f"{qid}. {words(8).capitalize()}")
+        if rnd.random() < 0.3:
+            lines.append(words(5) + "?")
+        lines.append(" ")
+        correct = rnd.randrange(5)
+        for k in range(5):
+            prefix = " √ " if k == correct else " •"
+            lines.append(prefix + words(6) + ";")
+            if rnd.random() < 0.05:
+                lines.append(words(3) + ";")
+        lines.append(" ")
+        if qid % 40 == 0:
+            lines.append(f"--- PAGE {qid // 40} ---")
+    return "\n".join(lines)
+
+
+def best_of(fn, arg, repeat):
+    # timeit kimi: ölçmə zamanı GC söndürülür ki, nəticə səs-küylü olmasın
+    best = float('inf')
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            t = time.perf_counter()
+            fn(arg)
+            best = min(best, time.perf_counter() - t)
+    finally:
+        gc.enable()
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    ap.add_argument('--repeat', type=int, default=3)
+    args = ap.parse_args()
+
+    print(f"{'suallar':>8} {'sətirlər':>9} {'köhnə, s':>10} {'yeni, s':>10} {'sürət':>7} {'yeni µs/sual':>13}")
+    rows = []
+    for n in args.sizes:
+        text = synthetic_text(n)
+        if parse_quiz_content(text) != legacy_parse_quiz_content(text):
+            sys.exit(f"{n} sual: yeni parser fərqli nəticə qaytardı")
+        old = best_of(legacy_parse_quiz_content, text, args.repeat)
+        new = best_of(parse_quiz_content, text, args.repeat)
+        rows.append((n, new))
+        print(f"{n:>8} {text.count(chr(10)) + 1:>9} {old:>10.3f} {new:>10.3f} {old / new:>6.2f}x {new / n * 1e6:>13.2f}")
+
+    if len(rows) > 1:
+        (n0, t0), (n1, t1) = rows[0], rows[-1]
+        # Xətti miqyaslanmada bu nisbət ~1.0 olmalıdır
+        print(f"miqyas: {n1 // n0}x çox sual -> {t1 / t0:.1f}x vaxt (sual başına nisbət {t1 / n1 / (t0 / n0):.2f})")
+
+
+if __name__ == '__main__':
+    main()
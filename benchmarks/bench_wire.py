@@ -0,0 +1,72 @@
+"""/api/questions cavabının ölçüsü və kodlama vaxtı.
+
+Köhnə formatı (tam lüğətlər, isCorrect/original_id, stdlib json, ensure_ascii)
+kompakt formatla (massivlər, keşlənmiş parçalar, orjson varsa) müqayisə edir,
+həmçinin gzip/brotli ilə ölçüləri göstərir.
+
+    python benchmarks/bench_wire.py [--exams 200]
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app  # noqa: E402
+
+
+def legacy_payload(bank, exam):
+    # user-006-dan əvvəlki cavab: variantlar isCorrect ilə, sual original_id ilə
+    out = []
+    for i, order in zip(exam.questions, exam.options):
+        q = bank.question(i)
+        out.append({'id': q['id'], 'text': q['text'], 'options': [q['options'][j] for j in order], 'original_id': q['id']})
+    return out
+
+
+def timed(fn, items):
+    t = time.perf_counter()
+    results = [fn(x) for x in items]
+    return results, (time.perf_counter() - t) / len(items) * 1e3
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--exams', type=int, default=200)
+    args = ap.parse_args()
+
+    bank = app.get_question_bank(app.PDF_FILENAME, app.BANK_FILENAME)
+    exams = [app.build_exam(bank, seed) for seed in range(args.exams)]
+    # Flask-ın jsonify-ı stdlib json-u ensure_ascii=True ilə işlədir
+    legacy_json = lambda e: json.dumps(legacy_payload(bank, e)).encode('ascii')
+
+    rows = []
+    legacy, t_legacy = timed(legacy_json, exams)
+    rows.append(('köhnə (jsonify)', legacy, t_legacy))
+
+    app._fragment_cache.clear()
+    _, t_cold = timed(lambda e: app.encode_compact_exam(bank, e), exams[:1])
+    compact, t_warm = timed(lambda e: app.encode_compact_exam(bank, e), exams)
+    rows.append(('kompakt', compact, t_warm))
+
+    gz, t_gz = timed(lambda b: gzip.compress(b, 6, mtime=0), compact)
+    rows.append(('kompakt + gzip', gz, t_warm + t_gz))
+    if app.brotli is not None:
+        br, t_br = timed(lambda b: app.brotli.compress(b, quality=5), compact)
+        rows.append(('kompakt + br', br, t_warm + t_br))
+    legacy_gz, t_lgz = timed(lambda b: gzip.compress(b, 6, mtime=0), legacy)
+    rows.append(('köhnə + gzip', legacy_gz, t_legacy + t_lgz))
+
+    print(f"JSON kodlayıcı: {'orjson' if app.orjson else 'stdlib json'}, {args.exams} vərəq, {len(exams[0].questions)} sual")
+    base = sum(map(len, legacy)) / len(legacy)
+    print(f"{'format':<18} {'bayt':>8} {'nisbət':>7} {'ms/vərəq':>9}")
+    for name, payloads, ms in rows:
+        size = sum(map(len, payloads)) / len(payloads)
+        print(f"{name:<18} {size:>8.0f} {size / base:>6.0%} {ms:>9.3f}")
+    print(f"kompakt, soyuq keş (ilk vərəq): {t_cold:.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
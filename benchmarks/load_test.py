@@ -0,0 +1,306 @@
+"""İmtahan serveri üçün yük testi və mikrobenchmark-lar.
+
+N namizədi səhifənin özünün etdiyi axınla simulyasiya edir:
+    GET /  ->  POST /api/register  ->  GET /api/session  ->  GET /api/questions?format=compact
+    ->  POST /api/session/answers (autosave)  ->  POST /api/grade  ->  GET /api/leaderboard  ->  GET /api/leaderboard/me
+və hər route üçün ötürmə qabiliyyətini və p50/p95/p99 gecikməni ölçür. Əlavə olaraq
+extract_text_from_pdf və parse_quiz_content vaxtını ayrıca prosesdə, öz müvəqqəti qovluğunda ölçür. Nəticə JSON-a yazılır və
+əvvəlki nəticə (baseline) ilə müqayisə oluna bilər.
+
+    python benchmarks/load_test.py --candidates 200 --concurrency 20 -o result.json
+    python benchmarks/load_test.py --gunicorn-workers 4 --baseline result.json
+    python benchmarks/load_test.py --url http://127.0.0.1:8000
+
+Server ayrıca müvəqqəti qovluqda (boş quiz.db ilə) işə salınır; --url verilərsə mövcud server istifadə olunur.
+"""
+import argparse
+import gzip
+import http.cookiejar
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PDF = os.path.join(ROOT, 'mmsillabussu.pdf')
+ROUTES = ['GET /', 'POST /api/register', 'GET /api/session', 'GET /api/questions?format=compact',
+          'POST /api/session/answers', 'POST /api/grade', 'GET /api/leaderboard', 'GET /api/leaderboard/me']
+AUTOSAVES = 5
+
+
+def prepare_workdir():
+    # Hər qaçış təmiz bazadan başlayır ki, nəticələr təkrarlana bilsin
+    workdir = tempfile.mkdtemp(prefix='examsim-bench-')
+    os.symlink(PDF, os.path.join(workdir, os.path.basename(PDF)))
+    return workdir
+
+
+class InProcessClient:
+    def __init__(self, flask_app):
+        self._client = flask_app.test_client()
+
+    def request(self, method, path, body=None):
+        resp = self._client.open(path, method=method, json=body)
+        data = resp.get_data()
+        if resp.status_code >= 400:
+            raise RuntimeError(f"{method} {path}: HTTP {resp.status_code}")
+        return data
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        self._base = base_url.rstrip('/')
+        self._opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self._base + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json', 'Accept-Encoding': 'gzip'})
+        with self._opener.open(req, timeout=60) as resp:
+            data = resp.read()
+            return gzip.decompress(data) if resp.headers.get('Content-Encoding') == 'gzip' else data
+
+
+def candidate_flow(client, n, record):
+    state = {}
+
+    def step(route, method, path, body=None, parse=True):
+        # Tətbiq xətaların çoxunu HTTP 200 + {"error": ...} (və ya {"success": false}) kimi qaytarır
+        t = time.perf_counter()
+        try:
+            data = client.request(method, path, body)
+            if parse:
+                data = json.loads(data)
+                if isinstance(data, dict) and ('error' in data or data.get('success') is False):
+                    raise RuntimeError(data)
+            ok = True
+        except Exception:
+            data, ok = None, False
+        record(route, time.perf_counter() - t, ok)
+        return data
+
+    step('GET /', 'GET', '/', parse=False)
+    step('POST /api/register', 'POST', '/api/register', {'username': f'bench-{n}-{random.getrandbits(32):08x}'})
+    session = step('GET /api/session', 'GET', '/api/session')
+    if session is None: return
+    state.update(session)
+    exam = step('GET /api/questions?format=compact', 'GET',
+                '/api/questions?' + urllib.parse.urlencode({'format': 'compact', 'seed': state['seed'], 'bank': state['bank'],
+                                                            **({'strata': state['strata']} if state.get('strata') else {})}))
+    if exam is None: return
+    questions = exam['q']
+    answers = [random.randrange(len(q[2])) if q[2] and random.random() < 0.9 else None for q in questions]
+    # Səhifə hər seçimdən sonra gecikmə ilə yalnız dəyişən cavabları göndərir
+    for chunk in range(AUTOSAVES):
+        delta = {str(i): answers[i] for i in range(chunk, len(answers), AUTOSAVES)}
+        step('POST /api/session/answers', 'POST', '/api/session/answers', {'a': delta})
+    step('POST /api/grade', 'POST', '/api/grade', {'seed': state['seed'], 'answers': answers})
+    step('GET /api/leaderboard', 'GET', '/api/leaderboard')
+    step('GET /api/leaderboard/me', 'GET', '/api/leaderboard/me')
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    # Nearest-rank: ceil(p/100 * n) - 1 (round() bankir yuvarlaqlaşdırması ilə bəzi n-lərdə bir sıra sürüşür)
+    k = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def run_load(make_client, candidates, concurrency):
+    samples = {route: [] for route in ROUTES}
+    errors = {route: 0 for route in ROUTES}
+    lock = threading.Lock()
+
+    def record(route, seconds, ok):
+        with lock:
+            samples[route].append(seconds)
+            if not ok:
+                errors[route] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(lambda n: candidate_flow(make_client(), n, record), range(candidates)))
+    wall = time.perf_counter() - started
+
+    routes = {}
+    for route in ROUTES:
+        values = sorted(samples[route])
+        routes[route] = {
+            'count': len(values),
+            'errors': errors[route],
+            'throughput_rps': len(values) / wall,
+            'p50_ms': (percentile(values, 50) or 0.0) * 1e3,
+            'p95_ms': (percentile(values, 95) or 0.0) * 1e3,
+            'p99_ms': (percentile(values, 99) or 0.0) * 1e3,
+        }
+    total = sum(r['count'] for r in routes.values())
+    return {'wall_s': wall, 'throughput_rps': total / wall, 'routes': routes}
+
+
+def run_micro(repeat):
+    # Ayrıca prosesdə, öz müvəqqəti qovluğunda: app import olunanda init_db quiz.db-ni cari qovluqda yaradır
+    workdir = prepare_workdir()
+    try:
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), '--micro-only', '--micro-repeat', str(repeat)],
+                             cwd=workdir, check=True, capture_output=True, text=True).stdout
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def micro_timings(repeat):
+    sys.path.insert(0, ROOT)
+    import app
+    timings = {}
+    best = float('inf')
+    for _ in range(repeat):
+        t = time.perf_counter()
+        text = app.extract_text_from_pdf(PDF)
+        best = min(best, time.perf_counter() - t)
+    timings['extract_text_from_pdf_ms'] = best * 1e3
+    best = float('inf')
+    for _ in range(repeat):
+        t = time.perf_counter()
+        app.parse_quiz_content(text)
+        best = min(best, time.perf_counter() - t)
+    timings['parse_quiz_content_ms'] = best * 1e3
+    return timings
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(workdir, workers):
+    port = free_port()
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}',
+                             '--chdir', workdir, '--pythonpath', ROOT, '--log-level', 'warning', 'app:app'])
+    url = f'http://127.0.0.1:{port}'
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(url + '/api/banks', timeout=1).read()
+            return proc, url
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit("gunicorn işə düşmədi")
+
+
+def compare(result, baseline, max_regression):
+    # Gecikmə (p95) və ya ötürmə qabiliyyəti baseline-dan max_regression-dan çox pisləşibsə False
+    ok = True
+    print(f"\n{'müqayisə':<42} {'baseline':>10} {'indi':>10} {'fərq':>8}")
+    rows = [('throughput_rps', baseline['load']['throughput_rps'], result['load']['throughput_rps'], True)]
+    for route in ROUTES:
+        old, new = baseline['load']['routes'].get(route), result['load']['routes'].get(route)
+        if old and new:
+            rows.append((f'{route} p95', old['p95_ms'], new['p95_ms'], False))
+    for key, old in baseline.get('micro', {}).items():
+        if key in result.get('micro', {}):
+            rows.append((key, old, result['micro'][key], False))
+    for name, old, new, higher_is_better in rows:
+        change = (new - old) / old if old else 0.0
+        worse = -change if higher_is_better else change
+        flag = '  <-- reqressiya' if worse > max_regression else ''
+        ok = ok and not flag
+        print(f"{name:<42} {old:>10.2f} {new:>10.2f} {change:>+7.0%}{flag}")
+    return ok
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--candidates', type=int, default=200)
+    ap.add_argument('--concurrency', type=int, default=20)
+    ap.add_argument('--url', help='Artıq işləyən server (məs. http://127.0.0.1:8000)')
+    ap.add_argument('--gunicorn-workers', type=int, default=0, help='0 - Flask test client ilə prosesin daxilində')
+    ap.add_argument('--micro-repeat', type=int, default=3)
+    ap.add_argument('--skip-micro', action='store_true')
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('-o', '--output', help='Nəticə JSON faylı')
+    ap.add_argument('--baseline', help='Müqayisə üçün əvvəlki nəticə JSON faylı')
+    ap.add_argument('--max-regression', type=float, default=0.2)
+    ap.add_argument('--micro-only', action='store_true', help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    random.seed(args.seed)
+    if args.micro_only:
+        print(json.dumps(micro_timings(args.micro_repeat)))
+        return
+
+    workdir = proc = None
+    if args.url:
+        mode = 'url'
+        make_client = lambda: HttpClient(args.url)
+    elif args.gunicorn_workers:
+        mode = f'gunicorn-{args.gunicorn_workers}'
+        workdir = prepare_workdir()
+        proc, url = start_gunicorn(workdir, args.gunicorn_workers)
+        make_client = lambda: HttpClient(url)
+    else:
+        mode = 'inprocess'
+        workdir = prepare_workdir()
+        os.chdir(workdir)
+        sys.path.insert(0, ROOT)
+        import app
+        make_client = lambda: InProcessClient(app.app)
+
+    try:
+        # İlk sorğular hər worker-də bankı qurur - ölçməyə daxil edilmir
+        for _ in range(max(1, args.gunicorn_workers) * 4):
+            make_client().request('GET', '/api/questions')
+        load = run_load(make_client, args.candidates, args.concurrency)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+        if workdir:
+            if mode == 'inprocess':
+                # Növbədəki yazılar qovluq silinməzdən əvvəl tətbiq olunsun (atexit çox gec işləyir)
+                app.write_behind.close()
+            os.chdir(ROOT)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {
+        'mode': mode,
+        'candidates': args.candidates,
+        'concurrency': args.concurrency,
+        'python': platform.python_version(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'load': load,
+        'micro': {} if args.skip_micro else run_micro(args.micro_repeat),
+    }
+
+    print(f"rejim: {mode}, {args.candidates} namizəd, paralel {args.concurrency}, "
+          f"{load['wall_s']:.2f} s, {load['throughput_rps']:.1f} sorğu/s")
+    print(f"{'route':<34} {'say':>6} {'xəta':>5} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for route, r in load['routes'].items():
+        print(f"{route:<34} {r['count']:>6} {r['errors']:>5} {r['throughput_rps']:>8.1f} "
+              f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+    for key, value in result['micro'].items():
+        print(f"{key:<34} {value:>10.2f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if not compare(result, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
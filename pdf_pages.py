@@ -0,0 +1,13 @@
+# PDF səhifələrinin mətni. app.py-dən ayrıdır: proses hovuzunun worker-ləri (forkserver)
+# bu funksiyanı unpickle edəndə yalnız bu modul import olunur - app.py-nin init_db(),
+# Flask tətbiqi və yazı növbəsinin atexit-i övlad proseslərdə işə düşmür.
+
+def extract_page_range(filename, start, stop):
+    import PyPDF2  # yalnız PDF həqiqətən oxunanda yüklənir
+    parts = []
+    with open(filename, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        for i in range(start, stop):
+            page_text = reader.pages[i].extract_text()
+            if page_text: parts.append(page_text + "\n")
+    return "".join(parts)
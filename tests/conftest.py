@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# app import olunanda init_db() işləyir - baza repo kökündə deyil, müvəqqəti qovluqda yaradılsın
+os.environ['QUIZ_DB'] = os.path.join(tempfile.mkdtemp(prefix='examsim-test-'), 'quiz.db')
+
+import app as quiz_app  # noqa: E402
+
+PDF = os.path.join(ROOT, quiz_app.PDF_FILENAME)
+
+
+def correct_answers(bank, exam):
+    # Vərəqdə göstərilən variant indeksləri ilə doğru cavablar (açarı olmayan sual boş qalır)
+    key = bank.answer_key()
+    return [order.index(key[i]) if key[i] >= 0 else None for i, order in zip(exam.questions, exam.options)]
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    return quiz_app
+
+
+@pytest.fixture(scope='session')
+def pdf_text(app_module):
+    text = app_module.extract_text_from_pdf(PDF)
+    assert text
+    return text
+
+
+@pytest.fixture(scope='session')
+def bank(app_module):
+    bank = app_module.get_question_bank(PDF)
+    assert len(bank)
+    return bank
+
+
+@pytest.fixture
+def client(app_module, monkeypatch, tmp_path):
+    # Standart bank PDF-dən oxunur (repo kökündəki .qbank nəzərə alınmır)
+    monkeypatch.setattr(app_module, 'PDF_FILENAME', PDF)
+    monkeypatch.setattr(app_module, 'BANK_FILENAME', str(tmp_path / 'none.qbank'))
+    return app_module.app.test_client()
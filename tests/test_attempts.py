@@ -0,0 +1,44 @@
+import time
+
+DAY = 86400
+
+
+def _daily(conn, machine_id):
+    return conn.execute('''SELECT day, attempts, best, total, timed FROM attempts_daily
+                           WHERE machine_id = ? ORDER BY day''', (machine_id,)).fetchall()
+
+
+def test_attempts_roll_up_into_daily_aggregates(app_module):
+    conn = app_module.get_db()
+    t = 1_700_000_000  # 2023-11-14 22:13 UTC
+    with conn:
+        app_module._apply_attempts(conn, [('att-1', t, 10, 60.0, 1), ('att-1', t + 60, 30, None, 2)])
+    with conn:
+        app_module._apply_attempts(conn, [('att-1', t + DAY, 20, 30.0, 3), ('att-2', t, 5, 10.0, 4)])
+    assert _daily(conn, 'att-1') == [('2023-11-14', 2, 30, 40, 1), ('2023-11-15', 1, 20, 20, 1)]
+    assert _daily(conn, 'att-2') == [('2023-11-14', 1, 5, 5, 1)]
+
+    daily, recent = app_module.attempt_history(conn, 'att-1')
+    assert [d['average'] for d in daily] == [20.0, 20.0]
+    assert [r['seed'] for r in recent] == [3, 2, 1]
+
+
+def test_compaction_keeps_aggregates(app_module):
+    conn = app_module.get_db()
+    now = time.time()
+    with conn:
+        app_module._apply_attempts(conn, [('att-old', now - 100 * DAY, 7, None, 1), ('att-old', now, 9, None, 2)])
+    before = _daily(conn, 'att-old')
+    assert app_module.compact_attempts(conn, retention_days=90, chunk_size=1) >= 1
+    assert conn.execute("SELECT seed FROM attempts WHERE machine_id = 'att-old'").fetchall() == [(2,)]
+    assert _daily(conn, 'att-old') == before
+
+
+def test_regrade_updates_attempts(app_module):
+    conn = app_module.get_db()
+    t = 1_600_000_000
+    with conn:
+        app_module._apply_attempts(conn, [('att-re', t, 10, None, 11), ('att-re', t + 5, 12, None, 12)])
+        app_module._regrade_attempts(conn, [('att-re', 11, 25)])
+    assert conn.execute("SELECT seed, score FROM attempts WHERE machine_id = 'att-re' ORDER BY seed").fetchall() == [(11, 25), (12, 12)]
+    assert _daily(conn, 'att-re') == [('2020-09-13', 2, 25, 37, 0)]
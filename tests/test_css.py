@@ -0,0 +1,27 @@
+import os
+import re
+
+from conftest import ROOT
+
+
+def test_downlevel_css(app_module):
+    css = ('@layer base{button,input:where([type=button],[type=submit]){appearance:button}'
+           'select:is([multiple],[size]) optgroup{font-weight:bolder}}'
+           '.px-2{padding-inline:calc(var(--spacing) * 2)}.ms-1{margin-inline-start:4px}.my-6{margin-block:1.5rem}'
+           '.x:where(.y){color:oklch(100% 0 0)}.inset-0{inset:0}')
+    assert app_module.downlevel_css(css) == (
+        'button,input[type=button],input[type=submit]{appearance:button}'
+        'select[multiple] optgroup,select[size] optgroup{font-weight:bolder}'
+        '.px-2{padding-left:calc(var(--spacing) * 2);padding-right:calc(var(--spacing) * 2)}'
+        '.ms-1{margin-left:4px}.my-6{margin-top:1.5rem;margin-bottom:1.5rem}'
+        '.x.y{color:#ffffff}.inset-0{top:0;right:0;bottom:0;left:0}')
+
+
+def test_committed_css_is_downleveled():
+    # static/app.css `flask build-css` ilə yaradılıb - Chrome 84-ün atdığı konstruksiyalar qalmamalıdır
+    with open(os.path.join(ROOT, 'static', 'app.css'), encoding='utf-8') as f:
+        css = f.read()
+    assert css.count('{') == css.count('}')
+    for construct in ('@layer', 'oklch(', ':is(', ':where('):
+        assert construct not in css
+    assert not re.search(r'(?<![\w-])(?:inset|(?:margin|padding)-(?:inline|block)[\w-]*):', css)
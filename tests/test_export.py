@@ -0,0 +1,63 @@
+import csv
+import gzip
+import io
+import xml.etree.ElementTree as ET
+import zipfile
+
+import pytest
+
+NS = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+
+
+@pytest.fixture(scope='module')
+def results(app_module):
+    # 2001-ci ilin nəticələri - digər testlərin cəhdləri ilə üst-üstə düşmür
+    conn = app_module.get_db()
+    users = [('exp-1', '=cmd|calc'), ('exp-2', 'Ə <b>&"\x01'), ('exp-3', 'Leyla')]
+    with conn:
+        conn.executemany("INSERT INTO users (machine_id, username, score) VALUES (?, ?, 0)", users)
+        app_module._apply_attempts(conn, [('exp-1', 978307200 + 3600, 40, 61.25, 1),    # 2001-01-01
+                                          ('exp-2', 978307200 + 86400, 15, None, 2),    # 2001-01-02
+                                          ('exp-3', 978307200 + 5 * 86400, 50, 10.0, 3)])
+    return app_module.parse_export_filters('2001-01-01', '2001-01-02')
+
+
+def test_csv_export(app_module, results):
+    rows = list(csv.reader(io.StringIO(b''.join(app_module.export_results(results)).decode('utf-8'))))
+    assert rows[0] == list(app_module.EXPORT_COLUMNS)
+    assert rows[1:] == [["'=cmd|calc", '2001-01-01 01:00:00', '40', '61.2', '1'],
+                        ['Ə <b>&"\x01', '2001-01-02 00:00:00', '15', '', '2']]
+
+    gz = gzip.decompress(b''.join(app_module.export_results(results, compress=True)))
+    assert gz == b''.join(app_module.export_results(results))
+
+
+def test_score_filter(app_module, results):
+    filters = app_module.parse_export_filters('2001-01-01', '2001-01-31', 20, None)
+    rows = list(csv.reader(io.StringIO(b''.join(app_module.export_results(filters)).decode('utf-8'))))
+    assert [row[4] for row in rows[1:]] == ['1', '3']
+
+
+def test_xlsx_export_is_valid(app_module, results):
+    data = b''.join(app_module.export_results(results, 'xlsx'))
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.testzip() is None
+        assert {'[Content_Types].xml', 'xl/workbook.xml', 'xl/worksheets/sheet1.xml'} <= set(zf.namelist())
+        sheet = ET.fromstring(zf.read('xl/worksheets/sheet1.xml'))
+    rows = sheet.findall('.//s:row', NS)
+    assert len(rows) == 3
+    cells = rows[2].findall('s:c', NS)
+    # Qadağan olunmuş XML simvolu atılır, qalanı escape olunur
+    assert cells[0].find('.//s:t', NS).text == 'Ə <b>&"'
+    assert cells[2].find('s:v', NS).text == '15'
+
+
+def test_export_api(app_module, client, monkeypatch):
+    assert client.get('/api/admin/export').status_code == 403
+    monkeypatch.setattr(app_module, 'ADMIN_TOKEN', 'secret')
+    headers = {'X-Admin-Token': 'secret'}
+    assert client.get('/api/admin/export?format=pdf', headers=headers).status_code == 400
+    assert client.get('/api/admin/export?from=yesterday', headers=headers).status_code == 400
+    resp = client.get('/api/admin/export?format=csv&gzip=1&from=2001-01-01&to=2001-01-02', headers=headers)
+    assert resp.headers['Content-Disposition'] == 'attachment; filename="results.csv.gz"'
+    assert gzip.decompress(resp.data).count(b'\n') == 3
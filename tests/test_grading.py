@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from conftest import correct_answers
+
+
+def test_grade_many(app_module, bank):
+    exams = [app_module.build_exam(bank, seed) for seed in (1, 2, 3)]
+    perfect = [correct_answers(bank, exam) for exam in exams]
+    empty = [[None] * len(exam.questions) for exam in exams]
+    answerable = [sum(a is not None for a in answers) for answers in perfect]
+
+    graded = app_module.grade_many(bank, exams, perfect)
+    assert [score for score, _, _ in graded] == answerable
+    assert [score for score, _, _ in app_module.grade_many(bank, exams, empty)] == [0, 0, 0]
+
+    result = app_module.grade_exam(bank, exams[0], perfect[0])
+    assert result['score'] == answerable[0]
+    assert result['correct'] + result['wrong'] + result['empty'] == len(exams[0].questions)
+    assert [r['correct'] for r in result['results']] == [-1 if a is None else a for a in perfect[0]]
+
+
+def test_regrade_submissions(app_module, bank, client):
+    conn = app_module.get_db()
+    exam = app_module.build_exam(bank, 7)
+    answers = correct_answers(bank, exam)
+    expected = sum(a is not None for a in answers)
+    with conn:
+        conn.execute("INSERT INTO users (machine_id, username, score) VALUES ('regrade-user', 'regrade', 0)")
+        # Köhnə (səhv) açarla saxlanılmış bal
+        conn.execute("INSERT INTO submissions (machine_id, bank, seed, strata, answers, score) VALUES (?, '', 7, NULL, ?, 0)",
+                     ('regrade-user', json.dumps(answers)))
+    assert app_module.regrade_submissions(conn) >= 1
+    assert conn.execute("SELECT score FROM submissions WHERE machine_id = 'regrade-user'").fetchone()[0] == expected
+    assert conn.execute("SELECT score FROM users WHERE machine_id = 'regrade-user'").fetchone()[0] == expected
+
+
+def test_regrade_rolls_back_on_error(app_module, bank, client, monkeypatch):
+    conn = app_module.get_db()
+    exam = app_module.build_exam(bank, 8)
+    with conn:
+        conn.execute("INSERT INTO submissions (machine_id, bank, seed, strata, answers, score) VALUES ('rollback-user', '', 8, NULL, ?, 0)",
+                     (json.dumps(correct_answers(bank, exam)),))
+
+    def broken(*args):
+        raise RuntimeError('boom')
+    monkeypatch.setattr(app_module, '_write_item_counts', broken)
+    with pytest.raises(RuntimeError):
+        app_module.regrade_submissions(conn)
+    assert not conn.in_transaction
+    assert conn.execute("SELECT score FROM submissions WHERE machine_id = 'rollback-user'").fetchone()[0] == 0
+
+
+def test_grade_only_open_session_once(app_module, client):
+    client.post('/api/register', json={'username': 'oracle'})
+    session = client.get('/api/session').json
+    n = len(client.get(f"/api/questions?seed={session['seed']}").json)
+
+    assert 'error' in client.post('/api/grade', json={'seed': session['seed'] + 1, 'answers': [None] * n}).json
+    first = client.post('/api/grade', json={'seed': session['seed'], 'answers': [None] * n}).json
+    assert first['score'] == 0
+    # Doğru cavablar açıqlandıqdan sonra eyni vərəq yenidən qiymətləndirilmir
+    replay = [r['correct'] if r['correct'] >= 0 else None for r in first['results']]
+    assert 'error' in client.post('/api/grade', json={'seed': session['seed'], 'answers': replay}).json
@@ -0,0 +1,40 @@
+from conftest import correct_answers
+
+
+def test_item_analysis_discrimination(app_module, bank, client):
+    conn = app_module.get_db()
+    exam = app_module.build_exam(bank, 11)
+    perfect = correct_answers(bank, exam)
+    # Güclü namizədlər hər şeyi, zəiflər heç nəyi bilmir - diskriminasiya müsbət olmalıdır
+    sheets = [perfect] * 5 + [[None] * len(perfect)] * 5
+    for answers in sheets:
+        graded = app_module.grade_many(bank, [exam], [answers])[0]
+        app_module.record_item_stats('analysis', bank, exam, graded)
+    items = {item['id']: item for item in app_module.item_analysis(conn, 'analysis', bank)}
+    qid = bank.question_id(next(i for i, a in zip(exam.questions, perfect) if a is not None))
+    assert items[qid]['shown'] == 10
+    assert items[qid]['correct'] == 5
+    assert items[qid]['difficulty'] == 0.5
+    assert items[qid]['discrimination'] > 0.9
+
+
+def test_option_histogram_and_suspect_key(app_module, bank, client):
+    conn = app_module.get_db()
+    exam = app_module.build_exam(bank, 12)
+    i = next(i for i in exam.questions if bank.answer_key()[i] >= 0 and bank.option_count(i) > 1)
+    pos = exam.questions.index(i)
+    key = bank.answer_key()[i]
+    wrong = next(j for j in range(bank.option_count(i)) if j != key)
+    perfect = correct_answers(bank, exam)
+    # Güclü namizədlər bu sualda "səhv" variantı seçir, zəiflər isə açardakını - açar şübhəlidir
+    strong = list(perfect)
+    strong[pos] = exam.options[pos].index(wrong)
+    weak = [None] * len(perfect)
+    weak[pos] = perfect[pos]
+    for answers in [strong] * 4 + [weak] * 4:
+        graded = app_module.grade_many(bank, [exam], [answers])[0]
+        app_module.record_item_stats('suspect', bank, exam, graded)
+    item = {item['id']: item for item in app_module.item_analysis(conn, 'suspect', bank)}[bank.question_id(i)]
+    assert item['key'] == key
+    assert item['options'][wrong] == 4 and item['options'][key] == 4
+    assert item['suspect']
@@ -0,0 +1,38 @@
+def _expected_rank(conn, score):
+    higher, total = conn.execute("SELECT SUM(score > ?), COUNT(*) FROM users", (score,)).fetchone()
+    return (higher or 0) + 1, total
+
+
+def test_rank_and_total_match_database(app_module):
+    conn = app_module.get_db()
+    with conn:
+        conn.executemany("INSERT INTO users (machine_id, username, score) VALUES (?, ?, ?)",
+                         [(f'lb-{i}', f'lb-{i}', score) for i, score in enumerate([0, 3, 7, 7, 12, 50])])
+    board = app_module.Leaderboard(size=3)
+    for score in (0, 1, 7, 8, 12, 50):
+        assert board.rank(score) == _expected_rank(conn, score)
+    top, etag = board.top()
+    assert [row['score'] for row in top] == [s for (s,) in conn.execute("SELECT score FROM users ORDER BY score DESC LIMIT 3")]
+
+    # Artımlı yeniləmə bazanı yenidən oxumadan Fenwick ağacını dəyişir
+    board.update('lb-0', 0, 49)
+    with conn:
+        conn.execute("UPDATE users SET score = 49 WHERE machine_id = 'lb-0'")
+    for score in (0, 1, 48, 49, 50):
+        assert board.rank(score) == _expected_rank(conn, score)
+    assert board.top()[1] != etag
+    assert {'username': 'lb-0', 'score': 49} in board.top()[0]
+    board.add_user()
+    assert board.rank(0)[1] == _expected_rank(conn, 0)[1] + 1
+
+def test_leaderboard_conditional_get(client):
+    first = client.get('/api/leaderboard')
+    assert first.status_code == 200 and first.headers['ETag']
+    again = client.get('/api/leaderboard', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+
+
+def test_my_rank(client):
+    client.post('/api/register', json={'username': 'lb-me'})
+    me = client.get('/api/leaderboard/me').json
+    assert me['score'] == 0 and 1 <= me['rank'] <= me['total']
@@ -0,0 +1,16 @@
+import os
+import sys
+
+from conftest import ROOT
+
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+from bench_parser import legacy_parse_quiz_content  # noqa: E402
+
+
+def test_parser_matches_legacy(app_module, pdf_text):
+    assert app_module.parse_quiz_content(pdf_text) == legacy_parse_quiz_content(pdf_text)
+
+
+def test_parser_single_question(app_module):
+    text = "1. Paytaxt hansıdır?\n• Gəncə\n√ Bakı\n2) İkinci sual\n- a\n- b\n"
+    assert app_module.parse_quiz_content(text) == legacy_parse_quiz_content(text)
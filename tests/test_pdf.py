@@ -0,0 +1,9 @@
+from conftest import PDF
+
+
+def test_parallel_extraction_matches_serial(app_module, pdf_text, monkeypatch):
+    monkeypatch.setattr(app_module, 'PARALLEL_PAGE_THRESHOLD', 0)
+    monkeypatch.setattr(app_module, 'PAGES_PER_TASK', 3)
+    monkeypatch.setattr(app_module.os, 'cpu_count', lambda: 2)
+    assert app_module.extract_text_from_pdf(PDF) == pdf_text
+
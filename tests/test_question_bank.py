@@ -0,0 +1,56 @@
+import os
+import shutil
+
+import pytest
+
+from conftest import PDF
+
+
+def test_failed_extraction_is_not_cached(app_module, monkeypatch, tmp_path):
+    pdf = str(tmp_path / 'retry.pdf')
+    shutil.copy(PDF, pdf)
+    extract = app_module.extract_text_from_pdf
+    monkeypatch.setattr(app_module, 'extract_text_from_pdf', lambda filename: None)
+    assert not app_module.get_question_bank(pdf).readable
+
+    monkeypatch.setattr(app_module, 'extract_text_from_pdf', extract)
+    bank = app_module.get_question_bank(pdf)
+    assert bank.readable and len(bank)
+    assert app_module.get_question_bank(pdf) is bank
+
+
+def test_compiled_bank_round_trip(app_module, bank, tmp_path):
+    path = str(tmp_path / 'test.qbank')
+    app_module.write_compiled_bank(bank.questions, bank.key[3], path)
+    mapped = app_module.MappedQuestionBank(path, os.stat(path))
+    assert len(mapped) == len(bank)
+    assert mapped.key[3] == bank.key[3]
+    assert mapped.answer_key() == bank.answer_key()
+    for i in range(len(bank)):
+        assert mapped.question(i) == bank.question(i)
+        assert mapped.question_id(i) == bank.question_id(i)
+        assert mapped.option_count(i) == bank.option_count(i)
+
+
+def test_stale_compiled_bank_falls_back_to_pdf(app_module, bank, tmp_path):
+    pdf = tmp_path / 'x.pdf'
+    shutil.copy(PDF, pdf)
+    qbank = str(tmp_path / 'x.qbank')
+    app_module.write_compiled_bank(bank.questions, 'f' * 64, qbank)
+    os.utime(pdf, ns=(os.stat(qbank).st_mtime_ns + 10**9,) * 2)
+    assert isinstance(app_module.get_question_bank(str(pdf), qbank), app_module.QuestionBank)
+
+
+@pytest.mark.parametrize('content', [b'', b'QBNK', b'XXXX' + bytes(60), None])
+def test_corrupt_compiled_bank_falls_back_to_pdf(app_module, bank, tmp_path, content):
+    qbank = str(tmp_path / 'broken.qbank')
+    if content is None:
+        # Başlıq düzgündür, amma fayl yarıda kəsilib
+        app_module.write_compiled_bank(bank.questions, bank.key[3], qbank)
+        with open(qbank, 'r+b') as f:
+            f.truncate(os.path.getsize(qbank) // 2)
+    else:
+        with open(qbank, 'wb') as f:
+            f.write(content)
+    fallback = app_module.get_question_bank(PDF, qbank)
+    assert isinstance(fallback, app_module.QuestionBank) and len(fallback) == len(bank)
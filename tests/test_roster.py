@@ -0,0 +1,26 @@
+import io
+
+
+def test_import_roster_reports_conflicts(app_module):
+    conn = app_module.get_db()
+    with conn:
+        conn.execute("INSERT INTO users (machine_id, username, score) VALUES ('roster-old', 'Aysel Quliyeva', 5)")
+    csv_text = "Ad Soyad\nAysel Quliyeva\nKamran Əliyev\n\nNigar Hüseynova\nKamran Əliyev\n"
+    created, conflicts = [], []
+    for new_users, taken in app_module.import_roster(io.StringIO(csv_text), chunk_size=2):
+        created.extend(new_users)
+        conflicts.extend(taken)
+    assert sorted(name for name, _ in created) == ['Kamran Əliyev', 'Nigar Hüseynova']
+    assert sorted(conflicts) == ['Aysel Quliyeva', 'Kamran Əliyev']
+    # Mövcud istifadəçi toxunulmaz qalır, yeniləri öz machine_id-ləri ilə yazılıb
+    assert conn.execute("SELECT machine_id, score FROM users WHERE username = 'Aysel Quliyeva'").fetchone() == ('roster-old', 5)
+    for name, machine_id in created:
+        assert conn.execute("SELECT username FROM users WHERE machine_id = ?", (machine_id,)).fetchone()[0] == name
+
+
+def test_roster_api_requires_admin(app_module, client, monkeypatch):
+    assert client.post('/api/admin/roster', data='X\n').status_code == 403
+    monkeypatch.setattr(app_module, 'ADMIN_TOKEN', 'secret')
+    resp = client.post('/api/admin/roster', data='Roster API\n', headers={'X-Admin-Token': 'secret'})
+    assert resp.json['created'] == 1
+    assert resp.json['users'][0]['login_url'].startswith('http://localhost/login/')
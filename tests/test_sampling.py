@@ -0,0 +1,34 @@
+import copy
+
+import pytest
+
+
+def test_build_exam_is_deterministic(app_module, bank):
+    assert app_module.build_exam(bank, 42) == app_module.build_exam(bank, 42)
+    assert app_module.build_exam(bank, 42) != app_module.build_exam(bank, 43)
+
+
+def test_build_exam_does_not_mutate_bank(app_module, bank):
+    before = copy.deepcopy([bank.question(i) for i in range(len(bank))])
+    exam = app_module.build_exam(bank, 5)
+    app_module.render_exam(bank, exam)
+    assert [bank.question(i) for i in range(len(bank))] == before
+    assert len(set(exam.questions)) == len(exam.questions) == min(app_module.EXAM_SIZE, len(bank))
+    assert all(sorted(order) == list(range(bank.option_count(i))) for i, order in zip(exam.questions, exam.options))
+
+
+def test_stratified_exam_is_proportional(app_module, bank):
+    exam = app_module.build_exam(bank, 9, count=20, strata=4)
+    groups = app_module._strata_indices(bank, 4)
+    counts = [sum(i in group for i in exam.questions) for group in groups]
+    assert sum(counts) == 20
+    assert max(counts) - min(counts) <= 1
+
+
+def test_parse_strata(app_module):
+    parse_strata = app_module.parse_strata
+    assert parse_strata(None) is None
+    assert parse_strata('5') == 5
+    assert parse_strata('1-200, 201-400') == [(1, 200), (201, 400)]
+    with pytest.raises(ValueError):
+        parse_strata('1,2')
@@ -0,0 +1,25 @@
+def _bank(app_module, version, texts):
+    questions = [app_module._build_question(i + 1, [text], [([f'{text} a'], True), (['b'], False)])
+                 for i, text in enumerate(texts)]
+    return app_module.QuestionBank('mem', ('mem', 0, 0, version), questions, 'x')
+
+
+def test_incremental_reindex(app_module):
+    conn = app_module.get_db()
+    bank = _bank(app_module, 'v1', ['Alma ağacı', 'Armud', 'Gilas'])
+    assert app_module.ensure_search_index(conn, 'search-test', bank) == 3
+    assert app_module.ensure_search_index(conn, 'search-test', bank) == 0
+    assert [r['id'] for r in app_module.search_bank(conn, 'search-test', bank, 'agac')[0]] == [1]
+
+    # Biri silinir, biri əlavə olunur - dəyişməyənlər yenidən indekslənmir
+    bank = _bank(app_module, 'v2', ['Alma ağacı', 'Armud', 'Şaftalı'])
+    assert app_module.ensure_search_index(conn, 'search-test', bank) == 2
+    assert app_module.search_bank(conn, 'search-test', bank, 'gilas')[0] == []
+    assert [r['id'] for r in app_module.search_bank(conn, 'search-test', bank, 'saftali')[0]] == [3]
+    assert conn.execute("SELECT COUNT(*) FROM search_docs WHERE bank = 'search-test'").fetchone()[0] == 3
+
+
+def test_search_page_bounds(client):
+    assert 'error' in client.get('/api/search?q=test&page=99999999999999999999').json
+    assert 'error' in client.get('/api/search?q=test&page=x').json
+    assert 'results' in client.get('/api/search?q=test&page=2').json
@@ -0,0 +1,19 @@
+def test_autosave_and_resume(app_module, client):
+    client.post('/api/register', json={'username': 'resume'})
+    session = client.get('/api/session').json
+    assert client.post('/api/session/answers', json={'a': {'0': 1, '3': 2}}).json == {'success': True}
+    assert client.post('/api/session/answers', json={'a': {'3': None}}).json == {'success': True}
+    app_module.write_behind.flush()
+    resumed = client.get('/api/session').json
+    assert resumed['seed'] == session['seed']
+    assert resumed['answers'] == {'0': 1}
+
+
+def test_autosave_rejects_bad_input(client):
+    client.post('/api/register', json={'username': 'badinput'})
+    client.get('/api/session')
+    for body in ({'a': {'٣': 1}}, {'a': {'1' * 5000: 1}}, {'a': {'0': 100}}, [1, 2], {'a': [1]}):
+        resp = client.post('/api/session/answers', json=body)
+        assert resp.status_code == 200 and 'error' in resp.json
+    resp = client.post('/api/grade', json=[1, 2])
+    assert resp.status_code == 200 and 'error' in resp.json
@@ -0,0 +1,61 @@
+import sqlite3
+import time
+
+import pytest
+
+
+@pytest.fixture
+def queue_(app_module, monkeypatch):
+    # Ayrı növbə: fon thread-i qısa busy_timeout ilə yeni bağlantı açır
+    monkeypatch.setattr(app_module, 'SQLITE_PRAGMAS',
+                        tuple(p for p in app_module.SQLITE_PRAGMAS if 'busy_timeout' not in p) + ("PRAGMA busy_timeout=20",))
+    wb = app_module.WriteBehind(interval=0.01)
+    wb._handlers = dict(app_module.write_behind._handlers)
+    monkeypatch.setattr(app_module, 'write_behind', wb)
+    yield wb
+    wb.close()
+
+
+def _user(conn, name):
+    with conn:
+        conn.execute("INSERT INTO users (machine_id, username, score) VALUES (?, ?, 0)", (name, name))
+    return name
+
+
+def test_flush_applies_queued_writes(app_module, queue_):
+    conn = app_module.get_db()
+    mid = _user(conn, 'wb-flush')
+    app_module.record_score(mid, 12, seed=1, duration=3.0)
+    queue_.flush()
+    assert conn.execute("SELECT score FROM users WHERE machine_id = ?", (mid,)).fetchone()[0] == 12
+    assert conn.execute("SELECT score, seed FROM attempts WHERE machine_id = ?", (mid,)).fetchall() == [(12, 1)]
+    assert mid not in {p[0] for p in app_module.pending_scores()}
+
+
+def test_locked_batch_is_retried(app_module, queue_):
+    conn = app_module.get_db()
+    mid = _user(conn, 'wb-locked')
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO exam_sessions (machine_id, bank, seed, strata, answers, started_at, updated_at, finished) "
+                     "VALUES (?, '', 5, NULL, '{}', 0, 0, 0)", (mid,))
+
+    blocker = sqlite3.connect(app_module.DB_FILENAME, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        app_module.record_score(mid, 30, seed=5, duration=1.0)
+        app_module.save_answer_delta(mid, {'0': 2})
+        time.sleep(0.3)  # bir neçə "database is locked" və təkrar cəhd
+        assert conn.execute("SELECT score FROM users WHERE machine_id = ?", (mid,)).fetchone()[0] == 0
+        # Yazılmamış vəziyyət itmir: read-your-writes davam edir
+        assert app_module.pending_score(mid) == 30
+        assert app_module.load_session(mid)['answers'] == {'0': 2}
+    finally:
+        blocker.rollback()
+        blocker.close()
+
+    queue_.flush()
+    assert conn.execute("SELECT score FROM users WHERE machine_id = ?", (mid,)).fetchone()[0] == 30
+    assert conn.execute("SELECT COUNT(*) FROM attempts WHERE machine_id = ?", (mid,)).fetchone()[0] == 1
+    assert conn.execute("SELECT answers FROM exam_sessions WHERE machine_id = ?", (mid,)).fetchone()[0] == '{"0":2}'
+    assert mid not in {p[0] for p in app_module.pending_scores()}
+    assert mid not in app_module._pending_answers